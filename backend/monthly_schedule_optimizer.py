@@ -9,14 +9,17 @@ Fixed to prevent duplicate doctors in the same shift.
 
 import datetime
 import time
+import os
 import logging
 import threading
 import random
-import copy
+import heapq
 from typing import Dict, List, Any, Tuple, Set, Callable, Optional
 from collections import defaultdict
+from operator import itemgetter
 import numpy as np
 import itertools
+import concurrent.futures
 
 # Configure logging
 logging.basicConfig(
@@ -25,6 +28,13 @@ logging.basicConfig(
 )
 logger = logging.getLogger("MonthlyScheduleOptimizer")
 
+# Most independent searches a single request may run through parallel_restarts
+MAX_PARALLEL_RESTARTS = 10
+
+def _popcount(mask: int) -> int:
+    """Number of set bits in mask; int.bit_count() would need Python 3.10."""
+    return bin(mask).count("1")
+
 class MonthlyScheduleOptimizer:
     def __init__(self, doctors: List[Dict], holidays: Dict[str, str],
                  availability: Dict[str, Dict[str, str]], month: int, year: int):
@@ -44,6 +54,7 @@ class MonthlyScheduleOptimizer:
         self.year = year
 
         # Create indices for faster lookups
+        self.doctor_names = tuple(doc["name"] for doc in doctors)
         self.doctor_indices = {doc["name"]: i for i, doc in enumerate(doctors)}
         self.doctor_info = {
             doc["name"]: {
@@ -52,6 +63,12 @@ class MonthlyScheduleOptimizer:
             } for doc in doctors
         }
         
+        # Shift named by each doctor's "<Shift> Only" preference (None otherwise)
+        self.pref_shift = {
+            name: info["pref"][:-len(" Only")] if info["pref"] in ("Day Only", "Evening Only", "Night Only") else None
+            for name, info in self.doctor_info.items()
+        }
+        
         # Group doctors by their preferences for faster lookup
         self.doctors_by_preference = defaultdict(list)
         for doc in doctors:
@@ -60,8 +77,13 @@ class MonthlyScheduleOptimizer:
         # Get lists of junior and senior doctors
         self.junior_doctors = [doc["name"] for doc in doctors if doc.get("seniority", "Junior") != "Senior"]
         self.senior_doctors = [doc["name"] for doc in doctors if doc.get("seniority", "Senior") == "Senior"]
+        self.junior_set = frozenset(self.junior_doctors)
+        self.senior_set = frozenset(self.senior_doctors)
+        self.contract_set = frozenset(doc["name"] for doc in doctors
+                                      if doc.get("contract") and doc.get("contractShiftsDetail"))
         
         self.shifts = ["Day", "Evening", "Night"]
+        self.shift_indices = {shift: i for i, shift in enumerate(self.shifts)}
         self.shift_requirements = {"Day": 2, "Evening": 1, "Night": 2}
         self.shift_hours = {"Day": 8, "Evening": 8, "Night": 8}
 
@@ -78,11 +100,19 @@ class MonthlyScheduleOptimizer:
         self.date_to_index = {date: i for i, date in enumerate(self.all_dates)}
         self.weekends = self._identify_weekends()
         self.weekdays = set(self.all_dates) - self.weekends
+        self.wh_dates = frozenset(self.weekends).union(self.holidays)
+        self.wh_date_list = [date for date in self.all_dates if date in self.wh_dates]
         
         # Precomputed date information for faster lookups
         self.date_info = {}
+        # Proleptic ordinal of each date, so day gaps are integer differences
+        self.date_ordinals = {}
+        # ISO week number of each date, used by the weekly shift cap
+        self.date_weeks = {}
         for date in self.all_dates:
             d = datetime.date.fromisoformat(date)
+            self.date_ordinals[date] = d.toordinal()
+            self.date_weeks[date] = d.isocalendar()[1]
             self.date_info[date] = {
                 "month": d.month,
                 "day": d.day,
@@ -127,6 +157,35 @@ class MonthlyScheduleOptimizer:
         # Cache doctor availability status for improved performance
         self._availability_cache = {}
         self._initialize_availability_cache()
+        # Filled in by the first _get_limited_availability_doctors call
+        self._limited_availability_cache = None
+        
+        # Integer-encoded views of availability and seniority (bit i is self.doctors[i])
+        self._available_masks = self._build_availability_masks()
+        self._junior_mask = 0
+        for doctor in self.junior_doctors:
+            self._junior_mask |= 1 << self.doctor_indices[doctor]
+        self._senior_mask = 0
+        for doctor in self.senior_doctors:
+            self._senior_mask |= 1 << self.doctor_indices[doctor]
+        # Doctors whose preference allows each shift, indexed by shift index
+        self._assignable_masks = [0] * len(self.shifts)
+        for doctor, bit in self.doctor_indices.items():
+            for s_idx, shift in enumerate(self.shifts):
+                if self._can_assign_to_shift(doctor, shift):
+                    self._assignable_masks[s_idx] |= 1 << bit
+        
+        # Required doctors per date and shift and the template's own slot counts;
+        # optimize() rebuilds these once shift_template has been set. The limits
+        # cap how many doctors a shift may hold, and the coverage table is what
+        # the final statistics count as understaffed
+        self._required_slots = self._build_required_slots()
+        self._slot_limits = self._build_required_slots(default_absent_shifts=True)
+        self._coverage_slots = self._build_required_slots(default_missing_slots=False)
+        self._template_slots = self._build_template_slots()
+        
+        # Doctors compared by the balance penalties; optimize() rebuilds this too
+        self._balance_groups = self._build_balance_groups()
         
         # Track doctors with same preferences for fairness calculations
         self.evening_preference_doctors = [d["name"] for d in doctors if d.get("pref", "None") == "Evening Only"]
@@ -136,22 +195,128 @@ class MonthlyScheduleOptimizer:
         # For monthly optimization, we can also track consecutive shifts more closely
         self.max_consecutive_shifts = 5  # Maximum number of consecutive days a doctor should work
         self.w_consecutive_shifts = 50   # Penalty for exceeding consecutive shift limit
+        
+        # Move handlers used by _candidate_moves, keyed by move type
+        self._move_handlers = {
+            "fix_contract": self._move_fix_contract,
+            "fill_template": self._move_fill_template,
+            "fix_duplicates": self._move_fix_duplicates,
+            "evening_preference": self._move_evening_preference,
+            "senior_workload": self._move_senior_workload,
+            "monthly_balance": self._move_monthly_balance,
+            "weekend_holiday_balance": self._move_weekend_holiday_balance,
+            "consecutive_days": self._move_consecutive_days,
+            "random": self._move_random,
+        }
+        
+        # Doctor position index for the schedule the search is currently on
+        self._indexed_schedule = None
+        self._schedule_index = {}
+        self._doctor_assignments = {}
+        self._monthly_hours = {}
+        self._doctors_to_exclude = frozenset()
+        self._weekend_holiday_hours = {}
+        self._consecutive_days = {}
+        self._limited_availability_doctors = {}
+        self._doctor_worked_days = {}
+        self._doctor_shift_totals = {}
+        self._doctor_costs = {}
+        self._preferred_shift_counts = {}
+        self._tracked_balance_cost = 0.0
+        self._shift_masks = []
+        self._day_masks = []
+        self._other_shift_masks = []
+        
+        # Pre-generated (date, shift, u) draws for the random moves
+        self._random_slot_pool = []
 
     def _initialize_availability_cache(self):
         """Initialize the availability cache for faster lookups."""
-        for doctor in [doc["name"] for doc in self.doctors]:
+        for doctor in self.doctor_names:
             for date in self.all_dates:
                 for shift in self.shifts:
                     key = (doctor, date, shift)
                     self._availability_cache[key] = self._calculate_doctor_availability(doctor, date, shift)
 
+    def _build_availability_masks(self):
+        """Pack availability into per-(date, shift) bitmasks indexed by date and shift index."""
+        available_masks = []
+        for date in self.all_dates:
+            masks = []
+            for shift in self.shifts:
+                mask = 0
+                for doctor, bit in self.doctor_indices.items():
+                    if self._is_doctor_available(doctor, date, shift):
+                        mask |= 1 << bit
+                masks.append(mask)
+            available_masks.append(masks)
+        return available_masks
+
+    def _build_required_slots(self, default_missing_slots=True, default_absent_shifts=False):
+        """
+        Doctors required per (date index, shift index): the template slots on
+        templated dates, otherwise self.shift_requirements.
+        
+        A template entry without a 'slots' key counts as the shift's default
+        requirement when default_missing_slots is set (0 otherwise), and a shift
+        the template leaves out counts as its default requirement when
+        default_absent_shifts is set (0 otherwise).
+        """
+        template = getattr(self, 'shift_template', None) or {}
+        required_slots = np.empty((len(self.all_dates), len(self.shifts)), dtype=np.int32)
+        for d_idx, date in enumerate(self.all_dates):
+            date_template = template.get(date)
+            for s_idx, shift in enumerate(self.shifts):
+                default = self.shift_requirements[shift]
+                if date_template is None:
+                    required_slots[d_idx, s_idx] = default
+                elif shift in date_template:
+                    required_slots[d_idx, s_idx] = date_template[shift].get(
+                        'slots', default if default_missing_slots else 0)
+                else:
+                    required_slots[d_idx, s_idx] = default if default_absent_shifts else 0
+        return required_slots
+
+    def _build_template_slots(self):
+        """
+        Slots listed by shift_template for each date index, as (shift index,
+        shift, slots) for the shifts whose template asks for at least one doctor.
+        Dates without a template get an empty tuple.
+        """
+        template = getattr(self, 'shift_template', None) or {}
+        template_slots = []
+        for date in self.all_dates:
+            date_template = template.get(date, {})
+            template_slots.append(tuple(
+                (s_idx, shift, date_template[shift].get('slots', 0))
+                for s_idx, shift in enumerate(self.shifts)
+                if shift in date_template and date_template[shift].get('slots', 0) > 0
+            ))
+        return template_slots
+
+    def _doctors_in_mask(self, mask):
+        """Decode a doctor bitmask into doctor names, in self.doctors order."""
+        doctors = self.doctors
+        names = []
+        while mask:
+            low_bit = mask & -mask
+            names.append(doctors[low_bit.bit_length() - 1]["name"])
+            mask ^= low_bit
+        return names
+
     def _get_limited_availability_doctors(self) -> Dict[str, int]:
         """
         Identify doctors with limited availability (available ≤ 20% of month's shifts).
         
+        Availability does not change once the optimizer is built, so the result
+        is computed on the first call and cached.
+        
         Returns:
             Dictionary mapping doctor names to their available days count
         """
+        if self._limited_availability_cache is not None:
+            return self._limited_availability_cache
+        
         # Count total possible shifts in the month
         total_possible_shifts = len(self.all_dates) * len(self.shifts)
         threshold_percentage = 0.2  # 20% availability threshold
@@ -159,7 +324,7 @@ class MonthlyScheduleOptimizer:
         
         # Count available shifts for each doctor
         doctor_availability_counts = {}
-        for doctor in [doc["name"] for doc in self.doctors]:
+        for doctor in self.doctor_names:
             available_shifts = 0
             for date in self.all_dates:
                 for shift in self.shifts:
@@ -175,7 +340,8 @@ class MonthlyScheduleOptimizer:
                                      if any(self._is_doctor_available(doctor, date, shift) 
                                             for shift in self.shifts)])
                 limited_availability_doctors[doctor] = available_days
-                
+        
+        self._limited_availability_cache = limited_availability_doctors
         return limited_availability_doctors
 
     def _calculate_doctor_availability(self, doctor: str, date: str, shift: str) -> bool:
@@ -276,6 +442,9 @@ class MonthlyScheduleOptimizer:
         
     def _get_week_number(self, date_str):
         """Get ISO week number for a date string."""
+        week = self.date_weeks.get(date_str)
+        if week is not None:
+            return week
         d = datetime.date.fromisoformat(date_str)
         return d.isocalendar()[1]  # Returns the ISO week number (1-53)
 
@@ -290,7 +459,7 @@ class MonthlyScheduleOptimizer:
         ONLY choosing those who are available and not already assigned on that day.
         Ensures no doctor appears more than once in the same shift and ALL SHIFTS ARE FILLED.
         """
-        doctor_names = [doc["name"] for doc in self.doctors]
+        doctor_names = self.doctor_names
         schedule = {}
         
         # Track assignments for workload balancing
@@ -300,6 +469,7 @@ class MonthlyScheduleOptimizer:
         # Track consecutive days worked
         consecutive_days = {doctor: 0 for doctor in doctor_names}
         last_worked_day = {doctor: None for doctor in doctor_names}
+        date_ordinals = self.date_ordinals
         
         # NEW: Track contract doctors and their shift requirements
         contract_doctors = [d for d in self.doctors if d.get("contract") and d.get("contractShiftsDetail")]
@@ -321,28 +491,20 @@ class MonthlyScheduleOptimizer:
         
         # Process shifts in order of constraint difficulty (most constrained first)
         shift_order = ["Evening", "Night", "Day"]
+        required_table = self._required_slots
+        shift_indices = self.shift_indices
         
-        for date in self.all_dates:
-            is_weekend_or_holiday = date in self.weekends or date in self.holidays
+        for d_idx, date in enumerate(self.all_dates):
+            is_weekend_or_holiday = date in self.wh_dates
             
             schedule[date] = {}
             assigned_today = set()  # Track doctors assigned on this date
             
             # Process shifts in the determined order
             for shift in shift_order:
-                # Check if this date has a template with this shift
-                has_shift_template = hasattr(self, 'shift_template') and date in self.shift_template
-                shift_in_template = has_shift_template and shift in self.shift_template[date]
-                
-                # Skip this shift if it's not in the template (and we have a template)
-                if has_shift_template and not shift_in_template:
-                    continue
-                
-                # Get the required doctor count from the template or defaults
-                if shift_in_template:
-                    required = self.shift_template[date][shift].get('slots', self.shift_requirements[shift])
-                else:
-                    required = self.shift_requirements[shift]
+                # Required doctor count from the template or defaults; shifts a
+                # template leaves out require none
+                required = int(required_table[d_idx, shift_indices[shift]])
                 
                 # Skip if no slots required for this shift
                 if required <= 0:
@@ -375,7 +537,7 @@ class MonthlyScheduleOptimizer:
                             contract_candidates.append((doctor_name, remaining_needed))
                     
                     # Sort by those who need the most shifts first
-                    contract_candidates.sort(key=lambda x: x[1], reverse=True)
+                    contract_candidates.sort(key=itemgetter(1), reverse=True)
                     
                     # Take as many contract doctors as needed, up to the required number for this shift
                     for doctor_name, _ in contract_candidates:
@@ -402,8 +564,8 @@ class MonthlyScheduleOptimizer:
                 # For weekend/holiday shifts, prioritize juniors
                 if is_weekend_or_holiday:
                     # Separate seniors and juniors
-                    junior_candidates = [d for d in preferred_docs if d in self.junior_doctors]
-                    senior_candidates = [d for d in preferred_docs if d in self.senior_doctors]
+                    junior_candidates = [d for d in preferred_docs if d in self.junior_set]
+                    senior_candidates = [d for d in preferred_docs if d in self.senior_set]
                     
                     # Use a probabilistic approach instead of strict prioritization
                     if random.random() < 0.7:  # 70% chance to favor juniors for holidays
@@ -459,8 +621,8 @@ class MonthlyScheduleOptimizer:
                     
                     # For weekend/holiday shifts, prioritize juniors among other candidates too
                     if is_weekend_or_holiday:
-                        junior_others = [d for d in other_candidates if d in self.junior_doctors]
-                        senior_others = [d for d in other_candidates if d in self.senior_doctors]
+                        junior_others = [d for d in other_candidates if d in self.junior_set]
+                        senior_others = [d for d in other_candidates if d in self.senior_set]
                         
                         # Sort each group by assignments, then combine
                         junior_others.sort(key=lambda d: assignments[d])
@@ -523,13 +685,18 @@ class MonthlyScheduleOptimizer:
                     
                     # ENHANCED APPROACH: Try to fill all required slots while respecting availability
                     # Look for ANY available doctor for this shift, even if they're assigned elsewhere
-                    # this might create duplicate assignments that the optimizer will fix later
-                    additional_pool = [
-                        d for d in doctor_names
-                        if d not in final_assigned and
-                        self._is_doctor_available(d, date, shift) and
-                        self._can_assign_to_shift(d, shift)
-                    ]
+                    # this might create duplicate assignments that the optimizer will fix later.
+                    # One pass splits the remaining available doctors by whether their
+                    # preference allows this shift
+                    additional_pool = []
+                    last_resort_pool = []
+                    for d in doctor_names:
+                        if d in final_assigned or not self._is_doctor_available(d, date, shift):
+                            continue
+                        if self._can_assign_to_shift(d, shift):
+                            additional_pool.append(d)
+                        else:
+                            last_resort_pool.append(d)
                     
                     # Sort by least assignments first
                     additional_pool.sort(key=lambda d: assignments[d])
@@ -539,37 +706,10 @@ class MonthlyScheduleOptimizer:
                         doctor = additional_pool.pop(0)
                         if doctor not in final_assigned:  # Final uniqueness check
                             final_assigned.append(doctor)
-                            
-                    # If we STILL don't have enough doctors, try more aggressive measures
-                    # while respecting the hard availability constraint
-                    if len(final_assigned) < required:
-                        # Find doctors who have the fewest assignments overall
-                        # and are available for this shift
-                        least_assigned_doctors = sorted(
-                            [(d, assignments[d]) for d in doctor_names 
-                             if d not in final_assigned and 
-                             self._is_doctor_available(d, date, shift) and
-                             self._can_assign_to_shift(d, shift)],
-                            key=lambda x: x[1]
-                        )
-                        
-                        # Keep adding doctors until we fill all slots
-                        for doctor, _ in least_assigned_doctors:
-                            if len(final_assigned) >= required:
-                                break
-                            if doctor not in final_assigned:
-                                final_assigned.append(doctor)
                                 
                     # STRONGER MEASURE: If we STILL can't fill all slots, then as a last resort,
                     # use any available doctor even if they have preference conflicts
                     if len(final_assigned) < required:
-                        last_resort_pool = [
-                            d for d in doctor_names
-                            if d not in final_assigned and
-                            self._is_doctor_available(d, date, shift)
-                            # Note: Not checking preference compatibility here
-                        ]
-                        
                         # Sort by least assignments
                         last_resort_pool.sort(key=lambda d: assignments[d])
                         
@@ -612,10 +752,8 @@ class MonthlyScheduleOptimizer:
                         weekend_holiday_assignments[doctor] += 1
                     
                     # Update consecutive days tracking
-                    d_date = datetime.date.fromisoformat(date)
                     if last_worked_day[doctor] is not None:
-                        last_d_date = datetime.date.fromisoformat(last_worked_day[doctor])
-                        if (d_date - last_d_date).days == 1:
+                        if date_ordinals[date] - date_ordinals[last_worked_day[doctor]] == 1:
                             consecutive_days[doctor] += 1
                         else:
                             consecutive_days[doctor] = 1
@@ -646,25 +784,16 @@ class MonthlyScheduleOptimizer:
         8. NEW: Doctors with shift contracts or limited availability are excluded from hour balance calculations.
            - Limited availability is defined as doctors available for ≤20% of the total possible shifts in the month.
            - These doctors are still assigned shifts but do not factor into workload balance penalties.
+        
+        The cost is the sum of _date_cost over all dates, _doctor_cost over all
+        doctors and _balance_cost over the hour and preference totals; the
+        tabu search scores neighbors through _objective_delta, which re-evaluates
+        only the parts a move touches.
         """
         cost = 0.0
-        doctor_names = [doc["name"] for doc in self.doctors]
-
-        # Pre-compute doctor assignments by date for faster access
-        doctor_assignments = {}
-        for doctor in doctor_names:
-            doctor_assignments[doctor] = {}
-            for date in self.all_dates:
-                if date in schedule:
-                    assigned_shift = None
-                    for shift in self.shifts:
-                        if shift in schedule[date] and doctor in schedule[date][shift]:
-                            assigned_shift = shift
-                            break
-                    doctor_assignments[doctor][date] = assigned_shift
 
-        # Get list of doctors to exclude from hour balance (contract doctors and limited availability doctors)
-        monthly_hours, doctors_to_exclude = self._calculate_monthly_hours(schedule)
+        # Contract and limited availability doctors are already zeroed in these totals
+        monthly_hours, _ = self._calculate_monthly_hours(schedule)
         weekend_holiday_hours, _ = self._calculate_weekend_holiday_hours(schedule)
         
         # Log limited availability doctors for clarity
@@ -674,538 +803,479 @@ class MonthlyScheduleOptimizer:
             for doctor, days in limited_availability_doctors.items():
                 logger.info(f"  {doctor}: {days} available days")
         
-        # NEW: Check for contract shift violations (hard constraint)
-        # Find doctors with contracts
-        contract_doctors = [d["name"] for d in self.doctors if d.get("contract") and d.get("contractShiftsDetail")]
-        if contract_doctors:
-            # Initialize shift counts for each contract doctor
-            doctor_shift_counts = {}
-            for doctor in self.doctors:
-                if doctor["name"] in contract_doctors:
-                    doctor_shift_counts[doctor["name"]] = {
-                        "Day": 0,
-                        "Evening": 0,
-                        "Night": 0
-                    }
-            
-            # Count the actual shifts worked by each doctor
-            for date in self.all_dates:
-                if date not in schedule:
-                    continue
-                
-                for shift in self.shifts:
-                    if shift not in schedule[date]:
-                        continue
-                    
-                    for doctor in schedule[date][shift]:
-                        # Check if this is a contract doctor
-                        if doctor in doctor_shift_counts:
-                            doctor_shift_counts[doctor][shift] += 1
-            
-            # Compare with expected contract shift numbers and count violations
-            for doctor in self.doctors:
-                if doctor["name"] in contract_doctors:
-                    doctor_name = doctor["name"]
-                    actual_shifts = doctor_shift_counts[doctor_name]
-                    expected_shifts = {
-                        "Day": doctor.get("contractShiftsDetail", {}).get("day", 0),
-                        "Evening": doctor.get("contractShiftsDetail", {}).get("evening", 0),
-                        "Night": doctor.get("contractShiftsDetail", {}).get("night", 0)
-                    }
-                    
-                    # Check if there's a mismatch between actual and expected shifts
-                    if (actual_shifts["Day"] != expected_shifts["Day"] or
-                        actual_shifts["Evening"] != expected_shifts["Evening"] or
-                        actual_shifts["Night"] != expected_shifts["Night"]):
-                        # Apply the highest weight (same as availability violations) to make this a hard constraint
-                        cost += self.w_avail
-                        logger.warning(f"Contract shift violation for {doctor_name}: Expected {expected_shifts}, got {actual_shifts}")
+        # Staffing, availability, duplicates, preferences and rest patterns by date
+        for date_idx in range(len(self.all_dates)):
+            cost += self._date_cost(schedule, date_idx)
+        
+        # Contracts, consecutive days and weekly distribution by doctor
+        worked_days, shift_totals = self._count_doctor_shifts(schedule)
+        for doctor in self.doctor_names:
+            cost += self._doctor_cost(schedule, doctor, worked_days[doctor], shift_totals[doctor],
+                                      limited_availability_doctors)
+        
+        # Workload, weekend/holiday and preference fairness across doctors
+        cost += self._balance_cost(monthly_hours, weekend_holiday_hours,
+                                   self._count_preferred_shifts(schedule))
+        
+        return cost
 
+    def _date_cost(self, schedule, date_idx):
+        """
+        Penalties attributed to self.all_dates[date_idx]: template staffing,
+        availability, one shift per day, duplicates, long holidays and preference
+        adherence on that date, plus the rest patterns that start on it.
+        """
+        cost = 0.0
+        all_dates = self.all_dates
+        date = all_dates[date_idx]
+        day = schedule.get(date)
+        
         # NEW: Check for unfilled slots in the shift template (super hard constraint)
-        for date in self.all_dates:
-            # Skip if this date is not in the template
-            has_shift_template = hasattr(self, 'shift_template') and date in self.shift_template
-            if not has_shift_template:
+        for _, shift, required_slots in self._template_slots[date_idx]:
+            # Count the actual number of doctors assigned to this shift
+            actual_slots = 0
+            if day is not None and shift in day:
+                actual_slots = len(day[shift])
+            
+            # Penalize if fewer doctors are assigned than required
+            if actual_slots < required_slots:
+                # Apply the highest penalty - this is a critical error
+                cost += self.w_unfilled_slots * (required_slots - actual_slots)
+            # NEW: Also penalize if more doctors are assigned than required
+            elif actual_slots > required_slots:
+                # Apply a high penalty for overstaffing as well
+                cost += self.w_unfilled_slots * (actual_slots - required_slots)
+        
+        if day is None:
+            return cost
+        
+        doctor_info = self.doctor_info
+        doctor_indices = self.doctor_indices
+        available_masks = self._available_masks[date_idx]
+        # Doctors working this date as a bitmask, and how many slots they fill
+        day_mask = 0
+        day_slots = 0
+        for shift_idx, shift in enumerate(self.shifts):
+            if shift not in day:
                 continue
                 
-            for shift in self.shifts:
-                # Skip if this shift is not in the template for this date
-                if shift not in self.shift_template[date]:
-                    continue
-                    
-                # Get required slots from the template
-                required_slots = self.shift_template[date][shift].get('slots', 0)
-                if required_slots <= 0:
-                    continue
-                
-                # Count the actual number of doctors assigned to this shift
-                actual_slots = 0
-                if date in schedule and shift in schedule[date]:
-                    actual_slots = len(schedule[date][shift])
+            shift_doctors = day[shift]
+            available_mask = available_masks[shift_idx]
+            shift_mask = 0
+            
+            for doctor in shift_doctors:
+                bit = 1 << doctor_indices[doctor]
+                shift_mask |= bit
                 
-                # Penalize if fewer doctors are assigned than required
-                if actual_slots < required_slots:
-                    # Apply the highest penalty - this is a critical error
-                    cost += self.w_unfilled_slots * (required_slots - actual_slots)
-                # NEW: Also penalize if more doctors are assigned than required
-                elif actual_slots > required_slots:
-                    # Apply a high penalty for overstaffing as well
-                    cost += self.w_unfilled_slots * (actual_slots - required_slots)
-        
-        # 1. Availability Violation Penalty (hard constraint)
-        for date in self.all_dates:
-            if date not in schedule:
-                continue
+                # 1. Availability Violation Penalty (hard constraint)
+                if not available_mask & bit:
+                    cost += self.w_avail
                 
-            for shift in self.shifts:
-                if shift not in schedule[date]:
-                    continue
-                    
-                for doctor in schedule[date][shift]:
-                    if not self._is_doctor_available(doctor, date, shift):
-                        cost += self.w_avail
-
-        # 2a. One shift per day penalty (hard constraint)
-        for date in self.all_dates:
-            if date not in schedule:
-                continue
+                # 8. Preference Adherence Penalty - super strict preference checking
+                pref = doctor_info[doctor]["pref"]
                 
-            assignments = {}
-            for shift in self.shifts:
-                if shift not in schedule[date]:
+                # Skip if no preference
+                if pref == "None":
                     continue
-
-                shift_doctors = schedule[date][shift]
-                
-                for doctor in shift_doctors:
-                    assignments[doctor] = assignments.get(doctor, 0) + 1
-                    
-            for count in assignments.values():
-                if count > 1:
-                    cost += self.w_one_shift * (count - 1)
-
-        # 2b. Duplicate doctor in the same shift penalty (severe constraint violation)
-        for date in self.all_dates:
-            if date not in schedule:
-                continue
                 
-            for shift in self.shifts:
-                if shift not in schedule[date]:
-                    continue
-                    
-                # Check for duplicates in this shift
-                shift_doctors = schedule[date][shift]
-                unique_doctors = set(shift_doctors)
-                if len(shift_doctors) > len(unique_doctors):
-                    # Apply severe penalty for each duplicate
-                    duplicate_count = len(shift_doctors) - len(unique_doctors)
-                    cost += self.w_duplicate_penalty * duplicate_count
+                # Apply extremely severe penalty for preference violations
+                if self.pref_shift[doctor] != shift:
+                    seniority = doctor_info[doctor]["seniority"]
+                    cost += self.w_pref.get(seniority, self.w_pref["Junior"]) * 2  # Double penalty as extra enforcement
                     
-                    # Log the issue
-                    duplicates = [d for d in shift_doctors if shift_doctors.count(d) > 1]
-                    logger.warning(f"Duplicate doctor(s) detected in {date}, {shift}: {duplicates}")
-
-        # 3. Rest constraints: penalize a night shift followed by a day or evening shift (hard constraint)
-        for i in range(len(self.all_dates) - 1):
-            current_date = self.all_dates[i]
-            next_date = self.all_dates[i + 1]
-            
-            if current_date not in schedule or "Night" not in schedule[current_date]:
-                continue
-                
-            if next_date not in schedule:
-                continue
-                
-            for doctor in schedule[current_date].get("Night", []):
-                if (doctor in schedule[next_date].get("Day", []) or 
-                    doctor in schedule[next_date].get("Evening", [])):
-                    cost += self.w_rest
-
-        # 3a. NEW: Explicitly check for consecutive night shifts (super hard constraint)
-        for i in range(len(self.all_dates) - 1):
-            current_date = self.all_dates[i]
-            next_date = self.all_dates[i + 1]
+                    # Extra penalty for evening/day pref doctors assigned to night shifts
+                    if shift == "Night" and (pref == "Evening Only" or pref == "Day Only"):
+                        cost += self.w_avail  # Apply availability-level penalty (100000)
             
-            if current_date not in schedule or "Night" not in schedule[current_date]:
-                continue
-                
-            if next_date not in schedule or "Night" not in schedule[next_date]:
-                continue
+            # 2b. Duplicate doctor in the same shift penalty (severe constraint violation):
+            # the shift holds a duplicate when it has more doctors than mask bits
+            duplicate_count = len(shift_doctors) - _popcount(shift_mask)
+            if duplicate_count:
+                # Apply severe penalty for each duplicate
+                cost += self.w_duplicate_penalty * duplicate_count
                 
-            for doctor in schedule[current_date].get("Night", []):
-                if doctor in schedule[next_date].get("Night", []):
-                    # Extremely severe penalty for consecutive night shifts
-                    cost += self.w_avail  # Using the highest weight (100000)
-
-        # 3b. NEW: Check for evening shift followed by day shift (soft constraint)
-        for i in range(len(self.all_dates) - 1):
-            current_date = self.all_dates[i]
-            next_date = self.all_dates[i + 1]
-            
-            if current_date not in schedule or "Evening" not in schedule[current_date]:
-                continue
-            
-            if next_date not in schedule or "Day" not in schedule[next_date]:
-                continue
-            
-            for doctor in schedule[current_date].get("Evening", []):
-                if doctor in schedule[next_date].get("Day", []):
-                    cost += self.w_evening_day
-
-        # 3c. NEW: Check for night shift followed by a day off then day shift (soft constraint)
-        for i in range(len(self.all_dates) - 2):
-            first_date = self.all_dates[i]
-            middle_date = self.all_dates[i + 1]
-            last_date = self.all_dates[i + 2]
-            
-            if first_date not in schedule or "Night" not in schedule[first_date]:
-                continue
-            
-            if last_date not in schedule or "Day" not in schedule[last_date]:
-                continue
+                # Log the issue
+                if logger.isEnabledFor(logging.WARNING):
+                    duplicates = [d for d in shift_doctors if shift_doctors.count(d) > 1]
+                    logger.warning("Duplicate doctor(s) detected in %s, %s: %s", date, shift, duplicates)
             
-            for doctor in schedule[first_date].get("Night", []):
-                # Check if doctor is not working on middle date
-                working_middle = False
-                if middle_date in schedule:
-                    for shift in self.shifts:
-                        if shift in schedule[middle_date] and doctor in schedule[middle_date][shift]:
-                            working_middle = True
-                            break
-                
-                if not working_middle:
+            day_mask |= shift_mask
+            day_slots += len(shift_doctors)
+        
+        # 2a. One shift per day penalty (hard constraint): every slot beyond a
+        # doctor's first on this date
+        extra_slots = day_slots - _popcount(day_mask)
+        if extra_slots:
+            cost += self.w_one_shift * extra_slots
+        
+        # 4. Long holiday constraint for seniors (hard constraint)
+        if self.holidays.get(date) == "Long":
+            for doctor in self._doctors_in_mask(day_mask):
+                if doctor_info[doctor]["seniority"] == "Senior":
+                    cost += self.w_senior_holiday
+        
+        if date_idx + 1 >= len(all_dates):
+            return cost
+        
+        next_date = all_dates[date_idx + 1]
+        next_day = schedule.get(next_date)
+        if next_day is not None:
+            if "Night" in day:
+                for doctor in day["Night"]:
+                    # 3. Rest constraints: penalize a night shift followed by a day or evening shift
+                    if (doctor in next_day.get("Day", []) or 
+                        doctor in next_day.get("Evening", [])):
+                        cost += self.w_rest
+                    
+                    # 3a. NEW: Consecutive night shifts (super hard constraint)
+                    if doctor in next_day.get("Night", []):
+                        # Extremely severe penalty for consecutive night shifts
+                        cost += self.w_avail  # Using the highest weight (100000)
+            
+            # 3b. NEW: Evening shift followed by day shift (soft constraint)
+            if "Evening" in day and "Day" in next_day:
+                for doctor in day["Evening"]:
+                    if doctor in next_day["Day"]:
+                        cost += self.w_evening_day
+        
+        # 3c. NEW: Night shift followed by a day off then day shift (soft constraint)
+        if date_idx + 2 < len(all_dates) and "Night" in day:
+            last_day = schedule.get(all_dates[date_idx + 2])
+            if last_day is not None and "Day" in last_day:
+                for doctor in day["Night"]:
+                    # Check if doctor is not working on middle date
+                    working_middle = next_day is not None and any(
+                        shift in next_day and doctor in next_day[shift] for shift in self.shifts)
+                    
                     # Check if doctor is working day shift on last date
-                    if doctor in schedule[last_date].get("Day", []):
+                    if not working_middle and doctor in last_day["Day"]:
                         cost += self.w_night_day_gap
+        
+        return cost
 
-        # 4. Long holiday constraint for seniors (hard constraint)
-        for date in self.all_dates:
-            if date in self.holidays and self.holidays[date] == "Long":
-                for doctor in doctor_names:
-                    if self.doctor_info[doctor]["seniority"] == "Senior":
-                        if (date in schedule and 
-                            any(shift in schedule[date] and doctor in schedule[date][shift] 
-                                for shift in self.shifts)):
-                            cost += self.w_senior_holiday
+    def _count_doctor_shifts(self, schedule):
+        """
+        Dense per-doctor shift counts of schedule, counting repeats within a shift.
+        
+        Returns:
+            Tuple of (worked_days, shift_totals): worked_days[doctor][date_idx] is the
+            number of shifts the doctor works on that date and
+            shift_totals[doctor][shift_idx] their month total of that shift.
+        """
+        num_dates = len(self.all_dates)
+        num_shifts = len(self.shifts)
+        worked_days = {doctor: [0] * num_dates for doctor in self.doctor_names}
+        shift_totals = {doctor: [0] * num_shifts for doctor in self.doctor_names}
+        for date_idx, date in enumerate(self.all_dates):
+            day = schedule.get(date)
+            if day is None:
+                continue
+            for shift_idx, shift in enumerate(self.shifts):
+                for doctor in day.get(shift, ()):
+                    worked_days[doctor][date_idx] += 1
+                    shift_totals[doctor][shift_idx] += 1
+        return worked_days, shift_totals
 
+    def _doctor_cost(self, schedule, doctor, worked_days, shift_totals, limited_availability_doctors):
+        """
+        Penalties attributed to a single doctor: contract shift counts, consecutive
+        working days and the spread of their shifts across the weeks of the month.
+        
+        worked_days and shift_totals are the doctor's rows of _count_doctor_shifts.
+        """
+        cost = 0.0
+        
         # 5. NEW: Consecutive shift limits
         # Penalize doctors working more than max_consecutive_shifts days in a row
-        consecutive_working_days = {doctor: 0 for doctor in doctor_names}
+        max_consecutive_shifts = self.max_consecutive_shifts
+        consecutive_working_days = 0
+        for worked in worked_days:
+            if worked:
+                consecutive_working_days += 1
+                if consecutive_working_days > max_consecutive_shifts:
+                    excess = consecutive_working_days - max_consecutive_shifts
+                    cost += self.w_consecutive_shifts * (excess ** 2)
+            else:
+                # Reset counter if not working today
+                consecutive_working_days = 0
+        
+        # NEW: Contract shift violations (hard constraint)
+        if doctor in self.contract_set:
+            shift_counts = dict(zip(self.shifts, shift_totals))
+            contract_detail = self.doctors[self.doctor_indices[doctor]].get("contractShiftsDetail", {})
+            expected_shifts = {
+                "Day": contract_detail.get("day", 0),
+                "Evening": contract_detail.get("evening", 0),
+                "Night": contract_detail.get("night", 0)
+            }
+            if shift_counts != expected_shifts:
+                # Apply the highest weight (same as availability violations) to make this a hard constraint
+                cost += self.w_avail
+                logger.warning("Contract shift violation for %s: Expected %s, got %s", doctor, expected_shifts, shift_counts)
         
-        for date in sorted(self.all_dates):
-            # First, increment consecutive days for doctors working today
-            working_today = set()
-            if date in schedule:
-                for shift in self.shifts:
-                    if shift in schedule[date]:
-                        working_today.update(schedule[date][shift])
-            
-            for doctor in doctor_names:
-                if doctor in working_today:
-                    consecutive_working_days[doctor] += 1
-                    # Penalize if exceeding maximum consecutive days
-                    if consecutive_working_days[doctor] > self.max_consecutive_shifts:
-                        excess = consecutive_working_days[doctor] - self.max_consecutive_shifts
-                        cost += self.w_consecutive_shifts * (excess ** 2)
-                else:
-                    # Reset counter if not working today
-                    consecutive_working_days[doctor] = 0
+        # 10. Distribution of shifts across the month
+        # A good schedule should distribute each doctor's shifts evenly across the month
+        weeks_in_month = len(self.all_dates) // 7 + (1 if len(self.all_dates) % 7 > 0 else 0)
+        total = sum(shift_totals)
+        if weeks_in_month > 1 and total > 0 and doctor not in limited_availability_doctors:
+            # Penalize uneven distribution across weeks
+            w_weekly_balance = 15  # Weight for weekly balance penalty
+            ideal_per_week = total / weeks_in_month
+            # all_dates starts on the 1st, so week w of the month is dates [7w, 7w + 7)
+            for week_start in range(0, len(worked_days), 7):
+                variance = abs(sum(worked_days[week_start:week_start + 7]) - ideal_per_week)
+                
+                # Only penalize significant variance (over 1.5 shifts from ideal)
+                if variance > 1.5:
+                    cost += w_weekly_balance * ((variance - 1.5) ** 2)
+        
+        # NEW: Check the maximum shifts per week constraint
+        max_shifts_per_week = self.doctor_info[doctor].get("max_shifts_per_week", 0)
+        if max_shifts_per_week > 0:
+            shifts_per_week = defaultdict(int)
+            date_weeks = self.date_weeks
+            shifts = self.shifts
+            for date in self.all_dates:
+                day = schedule.get(date)
+                if day is None:
+                    continue
+                for shift in shifts:
+                    if shift in day and doctor in day[shift]:
+                        shifts_per_week[date_weeks[date]] += 1
+            
+            for shifts_this_week in shifts_per_week.values():
+                # Apply severe penalty for exceeding max shifts per week
+                if shifts_this_week > max_shifts_per_week:
+                    excess = shifts_this_week - max_shifts_per_week
+                    # Use the dedicated parameter for max shifts per week constraint
+                    if hasattr(self, 'w_max_shifts_per_week'):
+                        cost += self.w_max_shifts_per_week * (excess ** 2)  # Square to penalize more as excess increases
+                    else:
+                        # Fallback to high weight if parameter not set
+                        cost += self.w_rest * 10 * (excess ** 2)
+        
+        return cost
 
-        # 6. Monthly workload balance - more important for monthly scheduling
-        monthly_hours, _ = self._calculate_monthly_hours(schedule)
+    def _count_preferred_shifts(self, schedule):
+        """Count, for each doctor with a "<Shift> Only" preference, the dates they work that shift."""
+        preferred_shift_counts = {}
+        for pref_type in ["Evening Only", "Day Only", "Night Only"]:
+            shift_type = pref_type.split()[0]  # "Evening", "Day", "Night"
+            for doctor in self.doctors_by_preference.get(pref_type, []):
+                preferred_shift_counts[doctor] = sum(
+                    1 for day in schedule.values() if shift_type in day and doctor in day[shift_type])
+        return preferred_shift_counts
+
+    def _build_balance_groups(self):
+        """
+        Resolve the doctors _balance_cost compares for this month's availability.
         
-        # Calculate junior and senior hours separately
-        # Get consistent list of limited availability doctors
+        Contract and limited availability doctors never change during a run, so
+        the filtered junior/senior groups, the active doctors of each preference
+        and the doctors counted in the overall hour spreads are fixed up front.
+        """
         limited_availability_doctors = self._get_limited_availability_doctors()
+        doctors_to_exclude = self.contract_set.union(limited_availability_doctors)
+        return {
+            "juniors": [doc for doc in self.junior_doctors if doc not in doctors_to_exclude],
+            "seniors": [doc for doc in self.senior_doctors if doc not in doctors_to_exclude],
+            "preference_groups": [
+                [doc for doc in self.doctors_by_preference.get(pref_type, [])
+                 if doc not in limited_availability_doctors]
+                for pref_type in ["Evening Only", "Day Only", "Night Only"]
+            ],
+            "balanced": [doc for doc in self.doctor_names if doc not in doctors_to_exclude],
+        }
+
+    def _variance(self, values):
+        """
+        Population variance of values, as np.var computes it.
         
-        # Exclude contract doctors and limited availability doctors from workload balance calculations
-        junior_hours = {doc: monthly_hours[doc][self.month] 
-                      for doc in self.junior_doctors 
-                      if doc not in limited_availability_doctors and doc not in contract_doctors}
+        Hour totals are integers, so the sums are exact and only the final
+        division rounds; this avoids building a NumPy array for each of the
+        handful of values _balance_cost compares per neighbor.
+        """
+        n = len(values)
+        total = sum(values)
+        return (n * sum(v * v for v in values) - total * total) / (n * n)
+
+    def _balance_cost(self, monthly_hours, weekend_holiday_hours, preferred_shift_counts):
+        """
+        Penalties that compare doctors with each other: workload and weekend/holiday
+        variance within juniors and seniors, seniors out-working juniors, fairness
+        between doctors sharing a preference and the overall hour spreads.
+        """
+        cost = 0.0
+        month = self.month
+        groups = self._balance_groups
         
-        senior_hours = {doc: monthly_hours[doc][self.month] 
-                      for doc in self.senior_doctors 
-                      if doc not in limited_availability_doctors and doc not in contract_doctors}
+        # 6. Monthly workload balance - more important for monthly scheduling
+        # Exclude contract doctors and limited availability doctors from workload balance calculations
+        junior_hours = [monthly_hours[doc][month] for doc in groups["juniors"]]
+        senior_hours = [monthly_hours[doc][month] for doc in groups["seniors"]]
         
         # Calculate within-group variance to ensure fairness within each group
-        if len(junior_hours) > 1:
-            junior_vals = list(junior_hours.values())
-            junior_variance = np.var(junior_vals)
-            # Penalize more severely as variance increases
-            if junior_variance > 24:  # More than 3 shift difference
-                cost += self.w_balance * 3 * junior_variance
-            elif junior_variance > 9:  # More than 1 shift difference
-                cost += self.w_balance * junior_variance
-            elif junior_variance > 1:  # Small differences
-                cost += self.w_balance * 0.1 * junior_variance
-                
-        if len(senior_hours) > 1:
-            senior_vals = list(senior_hours.values())
-            senior_variance = np.var(senior_vals)
-            # Penalize more severely as variance increases
-            if senior_variance > 24:  # More than 3 shift difference
-                cost += self.w_balance * 3 * senior_variance
-            elif senior_variance > 9:  # More than 1 shift difference
-                cost += self.w_balance * senior_variance
-            elif senior_variance > 1:  # Small differences
-                cost += self.w_balance * 0.1 * senior_variance
+        for group_hours in (junior_hours, senior_hours):
+            if len(group_hours) > 1:
+                variance = self._variance(group_hours)
+                # Penalize more severely as variance increases
+                if variance > 24:  # More than 3 shift difference
+                    cost += self.w_balance * 3 * variance
+                elif variance > 9:  # More than 1 shift difference
+                    cost += self.w_balance * variance
+                elif variance > 1:  # Small differences
+                    cost += self.w_balance * 0.1 * variance
                 
         # Ensure that, on average, seniors work less than juniors (comparing averages)
         if junior_hours and senior_hours:
-            junior_avg = np.mean(list(junior_hours.values()))
-            senior_avg = np.mean(list(senior_hours.values()))
+            junior_avg = sum(junior_hours) / len(junior_hours)
+            senior_avg = sum(senior_hours) / len(senior_hours)
             
             # Apply penalty if seniors work more than juniors on average
             if senior_avg > junior_avg:
                 cost += self.w_senior_workload * (senior_avg - junior_avg)
         
-        # 7. Weekend/Holiday fairness
-        wh_hours, _ = self._calculate_weekend_holiday_hours(schedule)
-        
-        # Calculate hours for each group, excluding doctors with limited availability and contract doctors
-        junior_wh_hours = {doc: wh_hours.get(doc, 0) for doc in self.junior_doctors 
-                          if doc not in limited_availability_doctors and doc not in contract_doctors}
-        senior_wh_hours = {doc: wh_hours.get(doc, 0) for doc in self.senior_doctors 
-                          if doc not in limited_availability_doctors and doc not in contract_doctors}
+        # 7. Weekend/Holiday fairness, excluding doctors with limited availability and contract doctors
+        junior_wh_hours = [weekend_holiday_hours.get(doc, 0) for doc in groups["juniors"]]
+        senior_wh_hours = [weekend_holiday_hours.get(doc, 0) for doc in groups["seniors"]]
         
         # Calculate within-group variance to ensure fairness within each group
-        if len(junior_wh_hours) > 1:
-            junior_vals = list(junior_wh_hours.values())
-            junior_variance = np.var(junior_vals)
-            cost += self.w_wh * junior_variance
-                
-        if len(senior_wh_hours) > 1:
-            senior_vals = list(senior_wh_hours.values())
-            senior_variance = np.var(senior_vals)
-            cost += self.w_wh * senior_variance
-
-        # 8. Preference Adherence Penalty
-        for date in self.all_dates:
-            if date not in schedule:
-                continue
-                
-            for shift in self.shifts:
-                if shift not in schedule[date]:
-                    continue
-                
-                shift_doctors = schedule[date][shift]
-                
-                # Super strict preference checking
-                for doctor in shift_doctors:
-                    pref = self.doctor_info[doctor]["pref"]
-                    seniority = self.doctor_info[doctor]["seniority"]
-                    
-                    # Skip if no preference
-                    if pref == "None":
-                        continue
-                    
-                    # Exact preference match check
-                    matches_pref = (pref == f"{shift} Only")
-                    
-                    # Apply extremely severe penalty for preference violations
-                    if not matches_pref:
-                        cost += self.w_pref.get(seniority, self.w_pref["Junior"]) * 2  # Double penalty as extra enforcement
-                        
-                        # Extra penalty for evening pref doctors assigned to night shifts
-                        if pref == "Evening Only" and shift == "Night":
-                            cost += self.w_avail  # Apply availability-level penalty (100000)
-                            
-                        # Extra penalty for day pref doctors assigned to night shifts
-                        if pref == "Day Only" and shift == "Night":
-                            cost += self.w_avail  # Apply availability-level penalty (100000)
+        for group_wh_hours in (junior_wh_hours, senior_wh_hours):
+            if len(group_wh_hours) > 1:
+                cost += self.w_wh * self._variance(group_wh_hours)
         
         # 9. Fairness between doctors with same preference
-        for pref_type in ["Evening Only", "Day Only", "Night Only"]:
-            doctors_with_pref = self.doctors_by_preference.get(pref_type, [])
-            
+        for pref_doctors in groups["preference_groups"]:
             # Only include active doctors (exclude those with limited availability)
-            active_doctors_with_pref = [doc for doc in doctors_with_pref if doc not in limited_availability_doctors.keys()]
-            
-            if len(active_doctors_with_pref) > 1:  # Only check if multiple active doctors share a preference
-                # Get counts of preferred shifts for each active doctor
-                counts = {}
-                for doc in active_doctors_with_pref:
-                    # Count shifts of this doctor's preference
-                    shift_type = pref_type.split()[0]  # "Evening", "Day", "Night"
-                    
-                    count = 0
-                    for date in schedule:
-                        if shift_type in schedule[date] and doc in schedule[date][shift_type]:
-                            count += 1
-                    
-                    counts[doc] = count
-                
-                if counts:
-                    # Calculate fairness metrics
-                    values = list(counts.values())
-                    if values:
-                        max_val = max(values)
-                        min_val = min(values)
-                        variance = max_val - min_val
-                        
-                        # Penalize unfair distribution among same-preference doctors
-                        multiplier = len(active_doctors_with_pref) / 2 
-                        if variance > 3:  # Allow small differences
-                            cost += self.w_preference_fairness * multiplier * ((variance - 3) ** 2)
-        
-        # 10. Distribution of shifts across the month
-        # A good schedule should distribute each doctor's shifts evenly across the month
-        # Calculate how many of each doctor's shifts should be in each week
-        weeks_in_month = len(self.all_dates) // 7 + (1 if len(self.all_dates) % 7 > 0 else 0)
-        
-        if weeks_in_month > 1:
-            # Get doctor's total shifts in the month (only for active doctors)
-            doctor_total_shifts = {doctor: 0 for doctor in doctor_names if doctor not in limited_availability_doctors.keys()}
-            
-            for date in self.all_dates:
-                if date in schedule:
-                    for shift in self.shifts:
-                        if shift not in schedule[date]:
-                            continue
-                        for doctor in schedule[date][shift]:
-                            if doctor in doctor_total_shifts:  # Only count active doctors
-                                doctor_total_shifts[doctor] = doctor_total_shifts.get(doctor, 0) + 1
-            
-            # Group dates by week
-            week_dates = defaultdict(list)
-            for date in self.all_dates:
-                d = datetime.date.fromisoformat(date)
-                # Calculate week number (0-indexed) within the month
-                week_num = (d.day - 1) // 7
-                week_dates[week_num].append(date)
-            
-            # Count shifts per doctor per week (only for active doctors)
-            doctor_week_shifts = {doctor: {week: 0 for week in range(weeks_in_month)} 
-                                for doctor in doctor_total_shifts.keys()}
-            
-            for week, dates in week_dates.items():
-                for date in dates:
-                    if date in schedule:
-                        for shift in self.shifts:
-                            if shift not in schedule[date]:
-                                continue
-                            for doctor in schedule[date][shift]:
-                                if doctor in doctor_week_shifts:  # Only count active doctors
-                                    doctor_week_shifts[doctor][week] += 1
-            
-            # Penalize uneven distribution across weeks
-            w_weekly_balance = 15  # Weight for weekly balance penalty
+            counts = [preferred_shift_counts[doc] for doc in pref_doctors]
             
-            for doctor, total in doctor_total_shifts.items():
-                if total > 0:
-                    # Calculate ideal shifts per week
-                    ideal_per_week = total / weeks_in_month
-                    
-                    # Calculate variance from ideal
-                    for week, count in doctor_week_shifts[doctor].items():
-                        variance = abs(count - ideal_per_week)
-                        
-                        # Only penalize significant variance (over 1.5 shifts from ideal)
-                        if variance > 1.5:
-                            cost += w_weekly_balance * ((variance - 1.5) ** 2)
-        
-        # 4. Monthly hours balance between doctors
-        # Calculate monthly hours for each doctor and exclude contract doctors
-        doctor_hours = {}
-        non_excluded_doctors = []
-        
-        for doctor, hours in monthly_hours.items():
-            # Skip doctors that should be excluded from balance calculations
-            if doctor in doctors_to_exclude:
-                continue
+            if len(counts) > 1:  # Only check if multiple active doctors share a preference
+                variance = max(counts) - min(counts)
                 
-            doctor_hours[doctor] = hours[self.month]
-            non_excluded_doctors.append(doctor)
+                # Penalize unfair distribution among same-preference doctors
+                multiplier = len(counts) / 2 
+                if variance > 3:  # Allow small differences
+                    cost += self.w_preference_fairness * multiplier * ((variance - 3) ** 2)
         
-        if len(non_excluded_doctors) > 1:
-            # Find min and max hours worked by any doctor this month
-            min_hours = min(doctor_hours[d] for d in non_excluded_doctors)
-            max_hours = max(doctor_hours[d] for d in non_excluded_doctors)
-            
+        # 4. Monthly hours balance between doctors, excluding contract and limited availability doctors
+        doctor_hours = [monthly_hours[doc][month] for doc in groups["balanced"]]
+        
+        if len(doctor_hours) > 1:
             # Calculate hour balance penalty if the difference is too large
-            if max_hours - min_hours > self.max_doctor_hour_balance:
+            hour_spread = max(doctor_hours) - min(doctor_hours)
+            if hour_spread > self.max_doctor_hour_balance:
                 # Apply quadratic penalty for larger differences
-                hour_balance_diff = max_hours - min_hours - self.max_doctor_hour_balance
+                hour_balance_diff = hour_spread - self.max_doctor_hour_balance
                 cost += self.w_balance * hour_balance_diff**2
         
         # 5. Weekend/holiday balance between doctors
-        non_excluded_wh_hours = {d: h for d, h in weekend_holiday_hours.items() if d not in doctors_to_exclude}
+        non_excluded_wh_hours = [weekend_holiday_hours[doc] for doc in groups["balanced"]]
         
         if len(non_excluded_wh_hours) > 1:
-            # Find min and max weekend/holiday hours
-            min_wh = min(non_excluded_wh_hours.values())
-            max_wh = max(non_excluded_wh_hours.values())
-            
             # Calculate weekend/holiday balance penalty
-            wh_diff = max_wh - min_wh
-            cost += self.w_wh * wh_diff
-        
-        # NEW: Check the maximum shifts per week constraint
-        # Group dates by week
-        week_map = {}
-        for date in self.all_dates:
-            week_num = self._get_week_number(date)
-            if week_num not in week_map:
-                week_map[week_num] = []
-            week_map[week_num].append(date)
-            
-        # For each doctor, count shifts per week and apply max per week constraint
-        doctor_names = [doc["name"] for doc in self.doctors]
-        for doctor in doctor_names:
-            # Only check if the doctor has a max_shifts_per_week constraint
-            max_shifts_per_week = self.doctor_info[doctor].get("max_shifts_per_week", 0)
-            
-            if max_shifts_per_week > 0:
-                for week_num, dates in week_map.items():
-                    # Count shifts for this doctor in this week
-                    shifts_this_week = 0
-                    
-                    for date in dates:
-                        if date not in schedule:
-                            continue
-                            
-                        for shift in self.shifts:
-                            if shift in schedule[date] and doctor in schedule[date][shift]:
-                                shifts_this_week += 1
-                    
-                    # Apply severe penalty for exceeding max shifts per week
-                    if shifts_this_week > max_shifts_per_week:
-                        excess = shifts_this_week - max_shifts_per_week
-                        # Use the dedicated parameter for max shifts per week constraint
-                        if hasattr(self, 'w_max_shifts_per_week'):
-                            cost += self.w_max_shifts_per_week * (excess ** 2)  # Square to penalize more as excess increases
-                        else:
-                            # Fallback to high weight if parameter not set
-                            cost += self.w_rest * 10 * (excess ** 2)
+            cost += self.w_wh * (max(non_excluded_wh_hours) - min(non_excluded_wh_hours))
         
         return cost
 
+    def _objective_delta(self, current_schedule, date, shift, new_doctors, bound=None):
+        """
+        Cost change from replacing the doctors of date/shift in current_schedule
+        with new_doctors.
+        
+        Only the dates whose penalties can see the changed shift (it and the two
+        before it, whose rest patterns reach it), the doctors who joined or left it
+        (from their tracked shift counts) and the balance terms over the adjusted
+        hour totals are re-evaluated.
+        
+        If bound is given, the terms are evaluated as a cascade, cheapest first:
+        date terms, then per-doctor terms, then the balance terms. After each
+        stage the remaining terms can at most drop to zero (they are non-negative),
+        so once the change provably cannot fall below bound the rest is skipped
+        and the returned lower bound, which is >= bound, stands in for the exact
+        change.
+        """
+        if current_schedule is not self._indexed_schedule:
+            self._index_schedule(current_schedule)
+        old_doctors = current_schedule.get(date, {}).get(shift, [])
+        if old_doctors == new_doctors:
+            return 0.0
+        
+        # Neighbor schedule sharing every date but the changed one with current_schedule
+        neighbor_schedule = current_schedule.copy()
+        neighbor_schedule[date] = dict(current_schedule.get(date, ()))
+        neighbor_schedule[date][shift] = new_doctors
+        
+        delta = 0.0
+        date_idx = self.date_to_index[date]
+        for i in range(max(date_idx - 2, 0), date_idx + 1):
+            delta += self._date_cost(neighbor_schedule, i) - self._date_cost(current_schedule, i)
+        
+        limited_availability_doctors = self._limited_availability_doctors
+        changed = {doctor: new_doctors.count(doctor) - old_doctors.count(doctor)
+                   for doctor in set(old_doctors).union(new_doctors)}
+        if bound is not None:
+            lower_bound = delta - self._tracked_balance_cost - sum(
+                self._doctor_costs[doctor] for doctor, change in changed.items() if change)
+            if lower_bound >= bound:
+                return lower_bound
+        monthly_hours = dict(self._monthly_hours)
+        weekend_holiday_hours = dict(self._weekend_holiday_hours)
+        preferred_shift_counts = dict(self._preferred_shift_counts)
+        hours = self.shift_hours[shift]
+        is_wh = date in self.wh_dates
+        only_pref = f"{shift} Only"
+        shift_idx = self.shift_indices[shift]
+        for doctor, change in changed.items():
+            if not change:
+                continue
+            worked_days = self._doctor_worked_days[doctor].copy()
+            worked_days[date_idx] += change
+            shift_totals = self._doctor_shift_totals[doctor].copy()
+            shift_totals[shift_idx] += change
+            delta += (self._doctor_cost(neighbor_schedule, doctor, worked_days, shift_totals,
+                                        limited_availability_doctors)
+                      - self._doctor_costs[doctor])
+            # Excluded doctors stay at zero, as in _calculate_monthly_hours
+            if doctor not in self._doctors_to_exclude:
+                monthly_hours[doctor] = {self.month: monthly_hours[doctor][self.month] + change * hours}
+                if is_wh:
+                    weekend_holiday_hours[doctor] += change * hours
+            if self.doctor_info[doctor]["pref"] == only_pref:
+                preferred_shift_counts[doctor] += (doctor in new_doctors) - (doctor in old_doctors)
+        
+        if bound is not None and delta - self._tracked_balance_cost >= bound:
+            return delta - self._tracked_balance_cost
+        
+        delta += self._balance_cost(monthly_hours, weekend_holiday_hours, preferred_shift_counts)
+        delta -= self._tracked_balance_cost
+        return delta
+
     def _calculate_monthly_hours(self, schedule):
         """Calculate monthly hours for each doctor more efficiently."""
-        doctor_names = [doc["name"] for doc in self.doctors]
-        monthly_hours = {doctor: {} for doctor in doctor_names}
+        doctor_names = self.doctor_names
+        month = self.month
         
         # Identify doctors with shift contracts to exclude them
-        contract_doctors = [d["name"] for d in self.doctors if d.get("contract") and d.get("contractShiftsDetail")]
+        contract_doctors = self.contract_set
         
         # Identify doctors with limited availability to exclude them
         limited_availability_doctors = self._get_limited_availability_doctors()
         
-        # Only calculate for this month
-        for doctor in doctor_names:
-            monthly_hours[doctor][self.month] = 0
-                
-        # Calculate hours from schedule
+        # Calculate hours from schedule into flat per-doctor totals, with each
+        # shift paired with its hours once rather than looked up per assignment
+        hours_worked = dict.fromkeys(doctor_names, 0)
+        shift_hours = [(shift, self.shift_hours[shift]) for shift in self.shifts]
         for date in self.all_dates:
-            if date not in schedule:
+            day = schedule.get(date)
+            if day is None:
                 continue
                 
-            for shift in self.shifts:
-                if shift not in schedule[date]:
-                    continue
-                    
-                for doctor in schedule[date][shift]:
-                    monthly_hours[doctor][self.month] += self.shift_hours[shift]
+            for shift, hours in shift_hours:
+                for doctor in day.get(shift, ()):
+                    hours_worked[doctor] += hours
+        
+        # Only calculate for this month
+        monthly_hours = {doctor: {month: hours} for doctor, hours in hours_worked.items()}
         
         # Zero out hours for contract doctors so they don't affect hour balancing
         for doctor in contract_doctors:
@@ -1220,34 +1290,29 @@ class MonthlyScheduleOptimizer:
             monthly_hours[doctor][self.month] = 0
         
         # Return the calculated hours, and also pass along which doctors to exclude from balancing
-        doctors_to_exclude = list(set(contract_doctors) | set(limited_availability_doctors.keys()))
+        doctors_to_exclude = self.contract_set.union(limited_availability_doctors)
         return monthly_hours, doctors_to_exclude
     
     def _calculate_weekend_holiday_hours(self, schedule):
         """Calculate weekend and holiday hours for each doctor within the month."""
-        doctor_names = [doc["name"] for doc in self.doctors]
+        doctor_names = self.doctor_names
         wh_hours = {doctor: 0 for doctor in doctor_names}
         
         # Identify doctors with shift contracts to exclude them
-        contract_doctors = [d["name"] for d in self.doctors if d.get("contract") and d.get("contractShiftsDetail")]
+        contract_doctors = self.contract_set
         
         # Identify doctors with limited availability to exclude them
         limited_availability_doctors = self._get_limited_availability_doctors()
         
-        for date in self.all_dates:
-            # Skip if not weekend or holiday
-            if date not in self.weekends and date not in self.holidays:
+        shift_hours = [(shift, self.shift_hours[shift]) for shift in self.shifts]
+        for date in self.wh_date_list:
+            day = schedule.get(date)
+            if day is None:
                 continue
                 
-            if date not in schedule:
-                continue
-                
-            for shift in self.shifts:
-                if shift not in schedule[date]:
-                    continue
-                    
-                for doctor in schedule[date][shift]:
-                    wh_hours[doctor] += self.shift_hours[shift]
+            for shift, hours in shift_hours:
+                for doctor in day.get(shift, ()):
+                    wh_hours[doctor] += hours
         
         # Zero out hours for contract doctors so they don't affect hour balancing
         for doctor in contract_doctors:
@@ -1262,45 +1327,246 @@ class MonthlyScheduleOptimizer:
             wh_hours[doctor] = 0
                     
         # Return the calculated hours and doctors to exclude
-        doctors_to_exclude = list(set(contract_doctors) | set(limited_availability_doctors.keys()))
+        doctors_to_exclude = self.contract_set.union(limited_availability_doctors)
         return wh_hours, doctors_to_exclude
 
-    def get_neighbors(self, current_schedule: Dict[str, Dict[str, List[str]]],
-                  num_moves: int = 20) -> List[Tuple[Dict[str, Dict[str, List[str]]], Tuple[str, str, str, str]]]:
+    def _index_schedule(self, schedule):
         """
-        Generate neighbor schedules by selecting a random (date, shift) slot and replacing one doctor.
-        Only consider available doctors for each shift based on their availability constraints.
-        Ensures no duplicate doctors appear in the same shift.
+        Build the per-(date, shift) doctor index for schedule.
+        
+        self._schedule_index[date][shift] maps each doctor in that shift to the
+        position of their first occurrence, so it answers both "is this doctor in
+        the shift" and list.index() with a single dict probe. The inverse view,
+        self._doctor_assignments[doctor][(date, shift)] -> position, the
+        per-date doctor bitmasks from _build_schedule_masks, the monthly and
+        weekend/holiday hour totals, consecutive working days, per-doctor shift
+        counts and _doctor_cost, preferred shift counts and the resulting
+        _balance_cost are kept alongside it and updated by _apply_move.
         """
-        neighbors = []
-        attempts = 0
-        max_attempts = num_moves * 10  # Allow more attempts to find valid moves
-        
-        # Pre-calculate workload to inform better moves
-        monthly_hours, doctors_to_exclude = self._calculate_monthly_hours(current_schedule)
-        weekend_holiday_hours, _ = self._calculate_weekend_holiday_hours(current_schedule)
-        
-        # Track which doctors have preference for which shifts
-        evening_pref_docs = [doc for doc in self.doctors if doc.get("pref", "None") == "Evening Only"]
-        evening_pref_names = [doc["name"] for doc in evening_pref_docs]
+        self._schedule_index = {}
+        self._doctor_assignments = {doctor: {} for doctor in self.doctor_indices}
+        for date, shifts in schedule.items():
+            for shift in shifts:
+                self._index_schedule_cell(schedule, date, shift)
+        self._shift_masks, self._day_masks, self._other_shift_masks = self._build_schedule_masks(schedule)
+        self._monthly_hours, self._doctors_to_exclude = self._calculate_monthly_hours(schedule)
+        self._weekend_holiday_hours, _ = self._calculate_weekend_holiday_hours(schedule)
+        self._consecutive_days = self._calculate_consecutive_days(schedule, self._day_masks)
+        self._limited_availability_doctors = self._get_limited_availability_doctors()
+        self._doctor_worked_days, self._doctor_shift_totals = self._count_doctor_shifts(schedule)
+        self._doctor_costs = {
+            doctor: self._doctor_cost(schedule, doctor, self._doctor_worked_days[doctor],
+                                      self._doctor_shift_totals[doctor], self._limited_availability_doctors)
+            for doctor in self.doctor_names
+        }
+        self._preferred_shift_counts = self._count_preferred_shifts(schedule)
+        self._tracked_balance_cost = self._tracked_balance()
+        self._indexed_schedule = schedule
+
+    def _index_schedule_cell(self, schedule, date, shift):
+        """Rebuild the index entries for a single (date, shift) of schedule."""
+        date_index = self._schedule_index.setdefault(date, {})
+        for doctor in date_index.get(shift, ()):
+            del self._doctor_assignments[doctor][(date, shift)]
+        positions = {}
+        for i, doctor in enumerate(schedule[date][shift]):
+            positions.setdefault(doctor, i)
+        date_index[shift] = positions
+        for doctor, i in positions.items():
+            self._doctor_assignments[doctor][(date, shift)] = i
+
+    def _apply_move(self, schedule, date, shift):
+        """
+        Point the tracked schedule state at schedule after a move is applied.
         
-        # Calculate preference satisfaction
-        preference_satisfaction = defaultdict(int)
-        for date in self.all_dates:
-            if date not in current_schedule:
+        Neighbors differ from the tracked schedule only in the (date, shift) the
+        move touched, so only that index entry and the masks of its date are
+        rebuilt, the hour totals are adjusted by the doctors that left and joined
+        the shift, and consecutive days are recounted for doctors whose "working
+        that day" bit changed.
+        """
+        if self._indexed_schedule is None:
+            self._index_schedule(schedule)
+            return
+        d_idx = self.date_to_index.get(date)
+        old_doctors = self._indexed_schedule.get(date, {}).get(shift, ())
+        new_doctors = schedule[date][shift]
+        if d_idx is not None:
+            self._update_tracked_hours(date, shift, old_doctors, -1)
+            self._update_tracked_hours(date, shift, new_doctors, 1)
+            shift_idx = self.shift_indices[shift]
+            for doctor in set(old_doctors).union(new_doctors):
+                change = new_doctors.count(doctor) - old_doctors.count(doctor)
+                if change:
+                    self._doctor_worked_days[doctor][d_idx] += change
+                    self._doctor_shift_totals[doctor][shift_idx] += change
+                    self._doctor_costs[doctor] = self._doctor_cost(
+                        schedule, doctor, self._doctor_worked_days[doctor],
+                        self._doctor_shift_totals[doctor], self._limited_availability_doctors)
+        only_pref = f"{shift} Only"
+        for doctor in set(old_doctors).symmetric_difference(new_doctors):
+            if self.doctor_info[doctor]["pref"] == only_pref:
+                self._preferred_shift_counts[doctor] += 1 if doctor in new_doctors else -1
+        self._index_schedule_cell(schedule, date, shift)
+        if d_idx is not None:
+            old_day_mask = self._day_masks[d_idx]
+            (self._shift_masks[d_idx], self._day_masks[d_idx],
+             self._other_shift_masks[d_idx]) = self._build_date_masks(schedule[date])
+            for doctor in self._doctors_in_mask(old_day_mask ^ self._day_masks[d_idx]):
+                self._consecutive_days[doctor] = self._trailing_work_run(self.doctor_indices[doctor])
+        self._tracked_balance_cost = self._tracked_balance()
+        self._indexed_schedule = schedule
+
+    def _tracked_balance(self):
+        """_balance_cost of the tracked hour and preferred shift totals."""
+        return self._balance_cost(self._monthly_hours, self._weekend_holiday_hours,
+                                  self._preferred_shift_counts)
+
+    def _trailing_work_run(self, doctor_bit):
+        """Length of the last run of consecutive days worked, read from the tracked day masks."""
+        run = 0
+        for day_mask in reversed(self._day_masks):
+            if day_mask >> doctor_bit & 1:
+                run += 1
+            elif run:
+                break
+        return run
+
+    def _update_tracked_hours(self, date, shift, doctors, sign):
+        """Add (sign=1) or remove (sign=-1) the hours of doctors working date/shift."""
+        hours = sign * self.shift_hours[shift]
+        is_wh = date in self.wh_dates
+        for doctor in doctors:
+            # Excluded doctors stay at zero, as in _calculate_monthly_hours
+            if doctor in self._doctors_to_exclude:
+                continue
+            self._monthly_hours[doctor][self.month] += hours
+            if is_wh:
+                self._weekend_holiday_hours[doctor] += hours
+
+    def _build_schedule_masks(self, schedule):
+        """
+        Pack a schedule into per-date doctor bitmasks (bit i is self.doctors[i]).
+        
+        Returns:
+            Tuple of (shift_masks, day_masks, other_shift_masks) indexed by date and
+            shift index: shift_masks covers a single shift, day_masks every shift of
+            the day and other_shift_masks every shift of the day except the given one.
+        """
+        shift_masks = []
+        day_masks = []
+        other_shift_masks = []
+        for date in self.all_dates:
+            masks, day_mask, others = self._build_date_masks(schedule.get(date, {}))
+            shift_masks.append(masks)
+            day_masks.append(day_mask)
+            other_shift_masks.append(others)
+        return shift_masks, day_masks, other_shift_masks
+
+    def _build_date_masks(self, day):
+        """Pack the shifts of a single date into (shift masks, day mask, other-shift masks)."""
+        masks = []
+        for shift in self.shifts:
+            mask = 0
+            for doctor in day.get(shift, ()):
+                mask |= 1 << self.doctor_indices[doctor]
+            masks.append(mask)
+        day_mask = 0
+        for mask in masks:
+            day_mask |= mask
+        others = []
+        for i in range(len(masks)):
+            other = 0
+            for j, mask in enumerate(masks):
+                if j != i:
+                    other |= mask
+            others.append(other)
+        return masks, day_mask, others
+
+    def get_neighbors(self, current_schedule: Dict[str, Dict[str, List[str]]],
+                  num_moves: int = 20) -> List[Tuple[Dict[str, Dict[str, List[str]]], Tuple[str, str, str, str]]]:
+        """
+        Generate neighbor schedules by selecting a random (date, shift) slot and replacing one doctor.
+        Only consider available doctors for each shift based on their availability constraints.
+        Ensures no duplicate doctors appear in the same shift.
+        
+        Returns (schedule, (date, shift, old_doctor, new_doctor)) pairs for the
+        moves of _candidate_moves.
+        """
+        return [
+            (self._create_new_schedule(current_schedule, date, shift, idx, old_doctor, new_doctor),
+             (date, shift, old_doctor, new_doctor))
+            for date, shift, idx, old_doctor, new_doctor in self._candidate_moves(current_schedule, num_moves)
+        ]
+
+    def _candidate_moves(self, current_schedule, num_moves=20):
+        """
+        Generate up to num_moves replacement moves (date, shift, idx, old_doctor, new_doctor)
+        for current_schedule without building the neighbor schedules.
+        """
+        moves = []
+        attempts = 0
+        max_attempts = num_moves * 10  # Allow more attempts to find valid moves
+        
+        # Schedule index, per-date bitmasks and hour totals are kept in step with
+        # accepted moves; rebuild them only when handed a different schedule
+        if current_schedule is not self._indexed_schedule:
+            self._index_schedule(current_schedule)
+        
+        # Bind the static date and shift lists once for the loops below
+        all_dates = self.all_dates
+        shifts = self.shifts
+        
+        # Workload totals to inform better moves
+        monthly_hours = self._monthly_hours
+        doctors_to_exclude = self._doctors_to_exclude
+        weekend_holiday_hours = self._weekend_holiday_hours
+        
+        # Doctors with an evening preference, precomputed in __init__
+        evening_pref_names = self.evening_preference_doctors
+        
+        # Calculate preference satisfaction (indexed by self.doctor_indices)
+        preference_satisfaction = np.zeros(len(self.doctors), dtype=np.int32)
+        doctor_info = self.doctor_info
+        doctor_indices = self.doctor_indices
+        only_prefs = [(shift, f"{shift} Only") for shift in shifts]
+        for date in all_dates:
+            day = current_schedule.get(date)
+            if not day:
                 continue
                 
-            for shift in self.shifts:
-                if shift not in current_schedule[date]:
-                    continue
-                
-                for doctor in current_schedule[date][shift]:
-                    pref = self.doctor_info[doctor]["pref"]
-                    if pref == f"{shift} Only":
-                        preference_satisfaction[doctor] += 1
+            for shift, only_pref in only_prefs:
+                for doctor in day.get(shift, ()):
+                    if doctor_info[doctor]["pref"] == only_pref:
+                        preference_satisfaction[doctor_indices[doctor]] += 1
         
         # Track consecutive days worked
-        consecutive_days = self._calculate_consecutive_days(current_schedule)
+        consecutive_days = self._consecutive_days
+        
+        # Per-date bitmasks so "already working today" is a single bit test
+        shift_masks = self._shift_masks
+        day_masks = self._day_masks
+        other_shift_masks = self._other_shift_masks
+        doctor_bits = self.doctor_indices
+        
+        # Locate duplicate doctors within a shift once per call; a shift holds a
+        # duplicate exactly when its bitmask has fewer bits than it has doctors
+        duplicate_locations = []
+        for d_idx, d in enumerate(all_dates):
+            if d not in current_schedule:
+                continue
+            for s_idx, s in enumerate(shifts):
+                shift_doctors = current_schedule[d].get(s)
+                if not shift_doctors or _popcount(shift_masks[d_idx][s_idx]) == len(shift_doctors):
+                    continue
+                seen_doctors = set()
+                duplicate_indices = []
+                for i, doctor in enumerate(shift_doctors):
+                    if doctor in seen_doctors:
+                        duplicate_indices.append(i)
+                    else:
+                        seen_doctors.add(doctor)
+                duplicate_locations.append((d, s, duplicate_indices))
         
         # NEW: Get contract doctors and their actual vs required shifts
         contract_doctors = [d for d in self.doctors if d.get("contract") and d.get("contractShiftsDetail")]
@@ -1308,6 +1574,7 @@ class MonthlyScheduleOptimizer:
         # If there are contract doctors, count their current shifts
         contract_shift_counts = {}
         contract_shift_requirements = {}
+        contract_violations = {}
         if contract_doctors:
             for doctor in contract_doctors:
                 doctor_name = doctor["name"]
@@ -1323,20 +1590,17 @@ class MonthlyScheduleOptimizer:
                 }
             
             # Count current shifts
-            for date in self.all_dates:
-                if date not in current_schedule:
+            for date in all_dates:
+                day = current_schedule.get(date)
+                if not day:
                     continue
                 
-                for shift in self.shifts:
-                    if shift not in current_schedule[date]:
-                        continue
-                    
-                    for doctor in current_schedule[date][shift]:
+                for shift in shifts:
+                    for doctor in day.get(shift, ()):
                         if doctor in contract_shift_counts:
                             contract_shift_counts[doctor][shift] += 1
             
             # Identify contract violations
-            contract_violations = {}
             for doctor_name, actual_shifts in contract_shift_counts.items():
                 required_shifts = contract_shift_requirements[doctor_name]
                 shift_diff = {
@@ -1347,1063 +1611,983 @@ class MonthlyScheduleOptimizer:
                 # If any shift type doesn't match requirements, it's a violation
                 if shift_diff["Day"] != 0 or shift_diff["Evening"] != 0 or shift_diff["Night"] != 0:
                     contract_violations[doctor_name] = shift_diff
+        
+        # Shared precomputed state handed to every move handler
+        state = {
+            "monthly_hours": monthly_hours,
+            "doctors_to_exclude": doctors_to_exclude,
+            "weekend_holiday_hours": weekend_holiday_hours,
+            "evening_pref_names": evening_pref_names,
+            "preference_satisfaction": preference_satisfaction,
+            "consecutive_days": consecutive_days,
+            "shift_masks": shift_masks,
+            "day_masks": day_masks,
+            "other_shift_masks": other_shift_masks,
+            "doctor_bits": doctor_bits,
+            "schedule_index": self._schedule_index,
+            "doctor_assignments": self._doctor_assignments,
+            "duplicate_locations": duplicate_locations,
+            "contract_doctors": contract_doctors,
+            "contract_shift_counts": contract_shift_counts,
+            "contract_violations": contract_violations,
+        }
+        
+        # Move handlers and their sampling weights
+        move_types = ["evening_preference", "senior_workload", "monthly_balance", 
+                    "weekend_holiday_balance", "consecutive_days", "fix_duplicates", 
+                    "fill_template", "random"]
+        
+        move_weights = [0.15, 0.15, 0.15, 0.15, 0.1, 0.3, 0.7, 0.05]
+        
+        # Prioritize fixing contract violations if they exist
+        if contract_doctors and any(contract_violations):
+            move_types.insert(0, "fix_contract")
+            # Give highest priority to fixing contracts
+            move_weights.insert(0, 1.5)
+        
+        move_handlers = [self._move_handlers[move_type] for move_type in move_types]
                     
         # More intelligent neighbor generation to target problem areas
-        while len(neighbors) < num_moves and attempts < max_attempts:
+        while len(moves) < num_moves and attempts < max_attempts:
             attempts += 1
             
-            # Initialize variables to None to check later
-            date = None
-            shift = None
-            idx = None
-            old_doctor = None
-            new_doctor = None
-            move_successful = False
-            
-            # NEW: Add fix_contract move with HIGHEST priority if there are contract violations
-            move_types = ["evening_preference", "senior_workload", "monthly_balance", 
-                        "weekend_holiday_balance", "consecutive_days", "fix_duplicates", 
-                        "fill_template", "random"]
-            
-            move_weights = [0.15, 0.15, 0.15, 0.15, 0.1, 0.3, 0.7, 0.05]
-            
-            # Prioritize fixing contract violations if they exist
-            if contract_doctors and any(contract_violations):
-                move_types.insert(0, "fix_contract")
-                # Give highest priority to fixing contracts
-                move_weights.insert(0, 1.5)  
-            
             # Decide which type of move to prioritize based on issues
-            move_type = random.choices(
-                move_types,
-                weights=move_weights,
-                k=1
-            )[0]
-            
-            # NEW: High-priority move type to fix contract violations
-            if move_type == "fix_contract" and contract_violations:
-                # Select a doctor with contract violation
-                doctor_name = random.choice(list(contract_violations.keys()))
-                shift_diff = contract_violations[doctor_name]
+            handler = random.choices(move_handlers, weights=move_weights, k=1)[0]
+            move = handler(current_schedule, state)
+            
+            # Keep the move only if all variables are properly set and the move was successful
+            if move is not None and None not in move:
+                moves.append(move)
+        
+        # If we couldn't generate enough smart moves, fall back to random ones
+        fallback_attempts = 0
+        max_fallback_attempts = num_moves * 10  # Limit attempts to avoid infinite loop
+        while len(moves) < num_moves and fallback_attempts < max_fallback_attempts:
+            fallback_attempts += 1
+            # Keep trying until we get enough moves or reach max attempts
+            random_move = self._get_random_move(current_schedule)
+            if random_move:
+                moves.append(random_move)
                 
-                # 1. FIRST PRIORITY: Add shifts where the doctor needs more
-                shifts_to_add = [s for s, diff in shift_diff.items() if diff > 0]
-                if shifts_to_add:
-                    shift_to_add = random.choice(shifts_to_add)
+        return moves
+
+    def _move_fix_contract(self, current_schedule, state):
+        """Move a contract doctor towards their required number of each shift type."""
+        day_masks = state["day_masks"]
+        other_shift_masks = state["other_shift_masks"]
+        doctor_bits = state["doctor_bits"]
+        contract_shift_counts = state["contract_shift_counts"]
+        contract_violations = state["contract_violations"]
+        schedule_index = state["schedule_index"]
+        date = None
+        shift = None
+        idx = None
+        old_doctor = None
+        new_doctor = None
+        move_successful = False
+        
+        # Select a doctor with contract violation
+        doctor_name = random.choice(list(contract_violations.keys()))
+        shift_diff = contract_violations[doctor_name]
+        
+        # 1. FIRST PRIORITY: Add shifts where the doctor needs more
+        shifts_to_add = [s for s, diff in shift_diff.items() if diff > 0]
+        if shifts_to_add:
+            shift_to_add = random.choice(shifts_to_add)
+            
+            # Find dates where we can add this doctor to this shift
+            potential_dates = []
+            doctor_bit = doctor_bits[doctor_name]
+            is_available = self._is_doctor_available
+            get_day = current_schedule.get
+            for d_idx, d in enumerate(self.all_dates):
+                # Check if doctor is available
+                if not is_available(doctor_name, d, shift_to_add):
+                    continue
                     
-                    # Find dates where we can add this doctor to this shift
-                    potential_dates = []
-                    for d in self.all_dates:
-                        # Check if doctor is available
-                        if not self._is_doctor_available(doctor_name, d, shift_to_add):
-                            continue
-                            
-                        # Check if already working another shift that day
-                        already_working = False
-                        if d in current_schedule:
-                            for s in self.shifts:
-                                if s in current_schedule[d] and doctor_name in current_schedule[d][s]:
-                                    already_working = True
-                                    break
-                        
-                        if already_working:
-                            continue
-                        
-                        # Check if this shift exists
-                        shift_exists = d in current_schedule and shift_to_add in current_schedule[d]
-                        
-                        # For non-existent shifts, we would need to create it
-                        if not shift_exists:
-                            # We'll just skip these cases for simplicity
-                            continue
-                            
-                        # If shift exists, check if this doctor is already in it
-                        if shift_exists and doctor_name in current_schedule[d][shift_to_add]:
-                            continue
-                            
-                        # This date is a candidate
-                        potential_dates.append(d)
+                # Check if already working another shift that day
+                if day_masks[d_idx] >> doctor_bit & 1:
+                    continue
+                
+                # For non-existent shifts, we would need to create it
+                day = get_day(d)
+                if not day or shift_to_add not in day:
+                    # We'll just skip these cases for simplicity
+                    continue
                     
-                    if potential_dates:
-                        date = random.choice(potential_dates)
-                        shift = shift_to_add
+                # If shift exists, check if this doctor is already in it
+                if doctor_name in schedule_index[d][shift_to_add]:
+                    continue
+                    
+                # This date is a candidate
+                potential_dates.append(d)
+            
+            if potential_dates:
+                date = random.choice(potential_dates)
+                shift = shift_to_add
+                
+                # We want to add this doctor - could either replace someone or add
+                shift_doctors = current_schedule.get(date, {}).get(shift)
+                if shift_doctors is not None:
+                    # If shift is already full, replace someone
+                    if len(shift_doctors) >= self.shift_requirements[shift]:
+                        # Try to replace a non-contract doctor if possible
+                        replaceable_indices = []
+                        for i, doc in enumerate(shift_doctors):
+                            if doc not in contract_shift_counts:
+                                replaceable_indices.append(i)
                         
-                        # We want to add this doctor - could either replace someone or add
-                        if date in current_schedule and shift in current_schedule[date]:
-                            # If shift is already full, replace someone
-                            if len(current_schedule[date][shift]) >= self.shift_requirements[shift]:
-                                # Try to replace a non-contract doctor if possible
-                                replaceable_indices = []
-                                for i, doc in enumerate(current_schedule[date][shift]):
-                                    if doc not in contract_shift_counts:
-                                        replaceable_indices.append(i)
-                                
-                                if replaceable_indices:
-                                    idx = random.choice(replaceable_indices)
-                                    old_doctor = current_schedule[date][shift][idx]
-                                    new_doctor = doctor_name
-                                    move_successful = True
-                            else:
-                                # Shift not full, simply add this doctor
-                                idx = -1  # Special code to indicate adding not replacing
-                                old_doctor = None
-                                new_doctor = doctor_name
-                                move_successful = True
+                        if replaceable_indices:
+                            idx = random.choice(replaceable_indices)
+                            old_doctor = shift_doctors[idx]
+                            new_doctor = doctor_name
+                            move_successful = True
+                    else:
+                        # Shift not full, simply add this doctor
+                        idx = -1  # Special code to indicate adding not replacing
+                        old_doctor = None
+                        new_doctor = doctor_name
+                        move_successful = True
+        
+        # 2. SECOND PRIORITY: Remove shifts where the doctor has too many
+        if not move_successful:
+            shifts_to_remove = [s for s, diff in shift_diff.items() if diff < 0]
+            if shifts_to_remove:
+                shift_to_remove = random.choice(shifts_to_remove)
                 
-                # 2. SECOND PRIORITY: Remove shifts where the doctor has too many
-                if not move_successful:
-                    shifts_to_remove = [s for s, diff in shift_diff.items() if diff < 0]
-                    if shifts_to_remove:
-                        shift_to_remove = random.choice(shifts_to_remove)
-                        
-                        # Find dates where this doctor is working this shift
-                        potential_dates = []
-                        for d in self.all_dates:
-                            if d in current_schedule and shift_to_remove in current_schedule[d]:
-                                if doctor_name in current_schedule[d][shift_to_remove]:
-                                    potential_dates.append(d)
-                        
-                        if potential_dates:
-                            date = random.choice(potential_dates)
-                            shift = shift_to_remove
+                # Find dates where this doctor is working this shift
+                potential_dates = []
+                for d in self.all_dates:
+                    day_index = schedule_index.get(d)
+                    if day_index and doctor_name in day_index.get(shift_to_remove, ()):
+                        potential_dates.append(d)
+                
+                if potential_dates:
+                    date = random.choice(potential_dates)
+                    shift = shift_to_remove
+                    
+                    # Find the index of this doctor in the shift
+                    idx = schedule_index[date][shift][doctor_name]
+                    old_doctor = doctor_name
+                    
+                    # Find a replacement doctor who's available
+                    available_replacements = []
+                    busy_mask = other_shift_masks[self.date_to_index[date]][self.shift_indices[shift]]
+                    for doc in self.doctor_names:
+                        # Skip if it's the same doctor
+                        if doc == doctor_name:
+                            continue
                             
-                            # Find the index of this doctor in the shift
-                            idx = current_schedule[date][shift].index(doctor_name)
-                            old_doctor = doctor_name
+                        # Skip other contract doctors to avoid creating new violations
+                        if doc in contract_shift_counts:
+                            continue
                             
-                            # Find a replacement doctor who's available
-                            available_replacements = []
-                            for doc in [d["name"] for d in self.doctors]:
-                                # Skip if it's the same doctor
-                                if doc == doctor_name:
-                                    continue
-                                    
-                                # Skip other contract doctors to avoid creating new violations
-                                if doc in contract_shift_counts:
-                                    continue
-                                    
-                                # Check availability
-                                if not self._is_doctor_available(doc, date, shift):
-                                    continue
-                                    
-                                # Check if already working another shift
-                                already_working = False
-                                for s in self.shifts:
-                                    if s == shift:
-                                        continue
-                                    if s in current_schedule[date] and doc in current_schedule[date][s]:
-                                        already_working = True
-                                        break
-                                
-                                if already_working:
-                                    continue
-                                    
-                                # Doctor is a potential replacement
-                                available_replacements.append(doc)
+                        # Check availability
+                        if not self._is_doctor_available(doc, date, shift):
+                            continue
                             
-                            if available_replacements:
-                                new_doctor = random.choice(available_replacements)
-                                move_successful = True
-            
-            # Existing move type - find and fill unfilled slots in the template
-            elif move_type == "fill_template":
-                # Check if we have a template
-                has_template = hasattr(self, 'shift_template') and self.shift_template
-                
-                if has_template:
-                    unfilled_slots = []
-                    
-                    # Look for unfilled slots in the template
-                    for d in self.all_dates:
-                        if d not in self.shift_template:
+                        # Check if already working another shift
+                        if busy_mask >> doctor_bits[doc] & 1:
                             continue
                             
-                        for s in self.shifts:
-                            if s not in self.shift_template[d]:
-                                continue
-                                
-                            # Get required slots from template
-                            required = self.shift_template[d][s].get('slots', 0)
-                            if required <= 0:
-                                continue
-                                
-                            # Count actual assigned doctors
-                            actual = 0
-                            if d in current_schedule and s in current_schedule[d]:
-                                actual = len(current_schedule[d][s])
-                                
-                            # If we need more doctors for this slot
-                            if actual < required:
-                                unfilled_slots.append((d, s, required - actual))
+                        # Doctor is a potential replacement
+                        available_replacements.append(doc)
                     
-                    if unfilled_slots:
-                        # Pick a random unfilled slot to fix
-                        d, s, missing = random.choice(unfilled_slots)
+                    if available_replacements:
+                        new_doctor = random.choice(available_replacements)
+                        move_successful = True
+        
+        if move_successful:
+            return date, shift, idx, old_doctor, new_doctor
+        return None
+
+    def _move_fill_template(self, current_schedule, state):
+        """Add a doctor to a template shift that has unfilled slots."""
+        monthly_hours = state["monthly_hours"]
+        day_masks = state["day_masks"]
+        doctor_bits = state["doctor_bits"]
+        contract_doctors = state["contract_doctors"]
+        date = None
+        shift = None
+        idx = None
+        old_doctor = None
+        new_doctor = None
+        move_successful = False
+        
+        # Check if we have a template
+        has_template = hasattr(self, 'shift_template') and self.shift_template
+        
+        if has_template:
+            unfilled_slots = []
+            
+            # Look for unfilled slots in the template
+            for d, template_day in zip(self.all_dates, self._template_slots):
+                if not template_day:
+                    continue
+                
+                day = current_schedule.get(d, {})
+                for _, s, required in template_day:
+                    # Count actual assigned doctors
+                    actual = len(day.get(s, ()))
                         
-                        # Find available doctors who could fill this slot
-                        available_doctors = []
-                        for doctor in [doc["name"] for doc in self.doctors]:
-                            # Must be available for this shift
-                            if not self._is_doctor_available(doctor, d, s):
-                                continue
-                                
-                            # Must be able to work this shift (preference compatible)
-                            if not self._can_assign_to_shift(doctor, s):
-                                continue
-                                
-                            # Check if already assigned to this shift
-                            already_in_shift = False
-                            if d in current_schedule and s in current_schedule[d]:
-                                already_in_shift = doctor in current_schedule[d][s]
-                                
-                            # Check if already assigned to another shift today
-                            already_assigned_today = False
-                            if d in current_schedule:
-                                for other_s in self.shifts:
-                                    if other_s == s:
-                                        continue
-                                    if other_s in current_schedule[d] and doctor in current_schedule[d][other_s]:
-                                        already_assigned_today = True
-                                        break
-                                        
-                            # Skip if already in this shift or another shift today
-                            if already_in_shift or already_assigned_today:
-                                continue
-                                
-                            # Add to available doctors
-                            available_doctors.append(doctor)
+                    # If we need more doctors for this slot
+                    if actual < required:
+                        unfilled_slots.append((d, s, required - actual))
+            
+            if unfilled_slots:
+                # Pick a random unfilled slot to fix
+                d, s, missing = random.choice(unfilled_slots)
+                
+                # Find available doctors who could fill this slot
+                available_doctors = []
+                d_idx = self.date_to_index[d]
+                # Doctors already in this shift or in another shift today
+                busy_mask = day_masks[d_idx]
+                for doctor in self.doctor_names:
+                    # Must be available for this shift
+                    if not self._is_doctor_available(doctor, d, s):
+                        continue
                         
-                        if available_doctors:
-                            # Sort by least assigned doctors first to maintain balance
-                            # Exclude contract doctors from sorting by workload
-                            non_contract_doctors = [doc for doc in available_doctors if doc not in contract_doctors]
-                            contract_doctor_list = [doc for doc in available_doctors if doc in contract_doctors]
-                            
-                            # Sort non-contract doctors by hours, keeping contract doctors separate
-                            non_contract_doctors.sort(key=lambda doc: 
-                                monthly_hours[doc].get(self.month, 0))
-                            
-                            # Prioritize non-contract doctors first to maintain hour balance
-                            sorted_doctors = non_contract_doctors + contract_doctor_list
-                            
-                            # Choose the doctor with least hours
-                            new_doc = sorted_doctors[0] if sorted_doctors else None
-                            
-                            if new_doc is not None:
-                                # Set up the move - this is an add operation, not a replacement
-                                date = d
-                                shift = s
-                                idx = -1  # Special value to indicate adding, not replacing
-                                old_doctor = None
-                                new_doctor = new_doc
-                                move_successful = True
-                                
-                                # Extra check for consecutive night shifts
-                                if shift == "Night" and new_doctor is not None:
-                                    # Check if doctor worked night shift yesterday
-                                    date_idx = self.all_dates.index(date)
-                                    if date_idx > 0:
-                                        prev_date = self.all_dates[date_idx - 1]
-                                        if (prev_date in current_schedule and 
-                                            "Night" in current_schedule[prev_date] and 
-                                            new_doctor in current_schedule[prev_date]["Night"]):
-                                            # Would create consecutive night shifts - reject
-                                            move_successful = False
-                                            
-                                    # Also check for next day's night shift
-                                    if date_idx < len(self.all_dates) - 1:
-                                        next_date = self.all_dates[date_idx + 1]
-                                        if (next_date in current_schedule and 
-                                            "Night" in current_schedule[next_date] and 
-                                            new_doctor in current_schedule[next_date]["Night"]):
-                                            # Would create consecutive night shifts - reject
-                                            move_successful = False
-                
-            # 0. Next high-priority move type - check for duplicate doctors in shifts
-            elif move_type == "fix_duplicates":
-                duplicates_found = False
-                for d in self.all_dates:
-                    if d not in current_schedule:
+                    # Must be able to work this shift (preference compatible)
+                    if not self._can_assign_to_shift(doctor, s):
                         continue
-                    
-                    for s in self.shifts:
-                        if s not in current_schedule[d]:
-                            continue
-                            
-                        # Check for duplicates in this shift
-                        shift_doctors = current_schedule[d][s]
-                        seen_doctors = set()
-                        duplicate_indices = []
                         
-                        for i, doctor in enumerate(shift_doctors):
-                            if doctor in seen_doctors:
-                                duplicate_indices.append(i)
-                            else:
-                                seen_doctors.add(doctor)
+                    # Skip if already in this shift or another shift today
+                    if busy_mask >> doctor_bits[doctor] & 1:
+                        continue
                         
-                        if duplicate_indices:
-                            duplicates_found = True
-                            # Get a duplicate doctor to replace
-                            index = random.choice(duplicate_indices)
-                            old_doc = shift_doctors[index]
-                            
-                            # Find alternative doctors who aren't in this shift
-                            available_doctors = []
-                            for doctor in [doc["name"] for doc in self.doctors]:
-                                # Skip doctors already in this shift
-                                if doctor in shift_doctors:
-                                    continue
-                                    
-                                # Must be available for this shift
-                                if not self._is_doctor_available(doctor, d, s):
-                                    continue
-                                    
-                                # Check if not already assigned to another shift today
-                                already_assigned = False
-                                for other_shift in self.shifts:
-                                    if other_shift == s:
-                                        continue
-                                    if other_shift in current_schedule[d] and doctor in current_schedule[d][other_shift]:
-                                        already_assigned = True
-                                        break
-                                        
-                                if not already_assigned:
-                                    available_doctors.append(doctor)
-                            
-                            if available_doctors:
-                                new_doc = random.choice(available_doctors)
-                                
-                                # Save the values
-                                date = d
-                                shift = s
-                                idx = index
-                                old_doctor = old_doc
-                                new_doctor = new_doc
-                                move_successful = True
-                                # Check that this move doesn't create consecutive night shifts
-                                if shift == "Night" and new_doctor is not None:
-                                    # Check if doctor worked night shift yesterday
-                                    date_idx = self.all_dates.index(date)
-                                    if date_idx > 0:
-                                        prev_date = self.all_dates[date_idx - 1]
-                                        if (prev_date in current_schedule and 
-                                            "Night" in current_schedule[prev_date] and 
-                                            new_doctor in current_schedule[prev_date]["Night"]):
-                                            move_successful = False  # Invalidate this move
-                                    
-                                    # Check if doctor would work night shift tomorrow
-                                    if date_idx < len(self.all_dates) - 1:
-                                        next_date = self.all_dates[date_idx + 1]
-                                        if (next_date in current_schedule and 
-                                            "Night" in current_schedule[next_date] and 
-                                            new_doctor in current_schedule[next_date]["Night"]):
-                                            move_successful = False  # Invalidate this move
-                                break
-                    
-                    if duplicates_found and move_successful:
-                        break
-                    
-            # 1. Evening shift preference issues
-            elif move_type == "evening_preference" and evening_pref_names:
-                # Find an evening shift that doesn't have a preference doctor
-                potential_dates = []
-                for d in self.all_dates:
-                    if d in current_schedule and "Evening" in current_schedule[d]:
-                        # Check if there's a non-preference doctor in this evening shift
-                        current_doctors = current_schedule[d]["Evening"]
-                        if any(doc not in evening_pref_names for doc in current_doctors):
-                            potential_dates.append(d)
+                    # Add to available doctors
+                    available_doctors.append(doctor)
                 
-                if potential_dates:
-                    date = random.choice(potential_dates)
-                    shift = "Evening"
-                    
-                    # Find a non-preference doctor to replace
-                    current_assignment = current_schedule[date][shift]
-                    non_pref_indices = [i for i, doc in enumerate(current_assignment) 
-                                    if doc not in evening_pref_names]
-                    
-                    if non_pref_indices:
-                        idx = random.choice(non_pref_indices)
-                        old_doctor = current_assignment[idx]
-                        
-                        # Find an evening preference doctor who's available and not already assigned
-                        available_pref_docs = []
-                        for doctor in evening_pref_names:
-                            # Skip if already in this shift (would cause duplicate)
-                            if doctor in current_assignment:
-                                continue
-                                
-                            # Skip if same as doctor being replaced (no-op)
-                            if doctor == old_doctor:
-                                continue
-                                
-                            # Check if available and not already assigned to another shift that day
-                            if not self._is_doctor_available(doctor, date, shift):
-                                continue
-                                
-                            already_assigned = False
-                            for other_shift in self.shifts:
-                                if other_shift == shift:
-                                    continue
-                                if other_shift in current_schedule[date] and doctor in current_schedule[date][other_shift]:
-                                    already_assigned = True
-                                    break
-                            
-                            if not already_assigned:
-                                available_pref_docs.append(doctor)
+                if available_doctors:
+                    # Sort by least assigned doctors first to maintain balance
+                    # Exclude contract doctors from sorting by workload
+                    non_contract_doctors = [doc for doc in available_doctors if doc not in contract_doctors]
+                    contract_doctor_list = [doc for doc in available_doctors if doc in contract_doctors]
+                    
+                    # Sort non-contract doctors by hours, keeping contract doctors separate
+                    non_contract_doctors.sort(key=lambda doc: 
+                        monthly_hours[doc].get(self.month, 0))
+                    
+                    # Prioritize non-contract doctors first to maintain hour balance
+                    sorted_doctors = non_contract_doctors + contract_doctor_list
+                    
+                    # Choose the doctor with least hours
+                    new_doc = sorted_doctors[0] if sorted_doctors else None
+                    
+                    if new_doc is not None:
+                        # Set up the move - this is an add operation, not a replacement
+                        date = d
+                        shift = s
+                        idx = -1  # Special value to indicate adding, not replacing
+                        old_doctor = None
+                        new_doctor = new_doc
+                        move_successful = True
                         
-                        if available_pref_docs:
-                            # Choose the preference doctor who has the fewest preferred shifts so far
-                            available_pref_docs.sort(key=lambda d: preference_satisfaction.get(d, 0))
-                            new_doctor = available_pref_docs[0]
-                            move_successful = True
-                            # Check that this move doesn't create consecutive night shifts
-                            if shift == "Night" and new_doctor is not None:
-                                # Check if doctor worked night shift yesterday
-                                date_idx = self.all_dates.index(date)
-                                if date_idx > 0:
-                                    prev_date = self.all_dates[date_idx - 1]
-                                    if (prev_date in current_schedule and 
-                                        "Night" in current_schedule[prev_date] and 
-                                        new_doctor in current_schedule[prev_date]["Night"]):
-                                        move_successful = False  # Invalidate this move
-                                
-                                # Check if doctor would work night shift tomorrow
-                                if date_idx < len(self.all_dates) - 1:
-                                    next_date = self.all_dates[date_idx + 1]
-                                    if (next_date in current_schedule and 
-                                        "Night" in current_schedule[next_date] and 
-                                        new_doctor in current_schedule[next_date]["Night"]):
-                                        move_successful = False  # Invalidate this move
-            
-            # 2. Target senior workload issues
-            elif move_type == "senior_workload":
-                # Focus on weekend/holiday shifts with seniors
-                potential_moves = []
+                        # Extra check for consecutive night shifts
+                        if shift == "Night" and self._creates_consecutive_night(new_doctor, date, current_schedule):
+                            move_successful = False
+        
+        if move_successful:
+            return date, shift, idx, old_doctor, new_doctor
+        return None
+
+    def _move_fix_duplicates(self, current_schedule, state):
+        """Replace a doctor that appears twice in the same shift."""
+        shift_masks = state["shift_masks"]
+        other_shift_masks = state["other_shift_masks"]
+        date = None
+        shift = None
+        idx = None
+        old_doctor = None
+        new_doctor = None
+        move_successful = False
+        
+        # Walk the precomputed duplicate locations in date order until a fix is found
+        for d, s, duplicate_indices in state["duplicate_locations"]:
+            shift_doctors = current_schedule[d][s]
+            # Get a duplicate doctor to replace
+            index = random.choice(duplicate_indices)
+            old_doc = shift_doctors[index]
+            
+            # Find alternative doctors who are available, not in this shift and
+            # not already assigned to another shift today
+            d_idx = self.date_to_index[d]
+            s_idx = self.shift_indices[s]
+            candidate_mask = self._available_masks[d_idx][s_idx] & ~(shift_masks[d_idx][s_idx] | other_shift_masks[d_idx][s_idx])
+            available_doctors = self._doctors_in_mask(candidate_mask)
+            
+            if available_doctors:
+                new_doc = random.choice(available_doctors)
+                
+                # Save the values
+                date = d
+                shift = s
+                idx = index
+                old_doctor = old_doc
+                new_doctor = new_doc
+                move_successful = True
+                # Check that this move doesn't create consecutive night shifts
+                if shift == "Night" and self._creates_consecutive_night(new_doctor, date, current_schedule):
+                    move_successful = False
+            
+            if move_successful:
+                break
+        
+        if move_successful:
+            return date, shift, idx, old_doctor, new_doctor
+        return None
+
+    def _move_evening_preference(self, current_schedule, state):
+        """Replace a non-preference doctor on an Evening shift with an Evening Only doctor."""
+        evening_pref_names = state["evening_pref_names"]
+        if not evening_pref_names:
+            # Nothing to target - fall back to a random move
+            return self._move_random(current_schedule, state)
+        preference_satisfaction = state["preference_satisfaction"]
+        other_shift_masks = state["other_shift_masks"]
+        doctor_bits = state["doctor_bits"]
+        date = None
+        shift = None
+        idx = None
+        old_doctor = None
+        new_doctor = None
+        move_successful = False
+        
+        # Find an evening shift that doesn't have a preference doctor
+        potential_dates = []
+        for d in self.all_dates:
+            current_doctors = current_schedule.get(d, {}).get("Evening")
+            # Check if there's a non-preference doctor in this evening shift
+            if current_doctors is not None and any(doc not in evening_pref_names for doc in current_doctors):
+                potential_dates.append(d)
+        
+        if potential_dates:
+            date = random.choice(potential_dates)
+            shift = "Evening"
+            
+            # Find a non-preference doctor to replace
+            current_assignment = current_schedule[date][shift]
+            non_pref_indices = [i for i, doc in enumerate(current_assignment) 
+                            if doc not in evening_pref_names]
+            
+            if non_pref_indices:
+                idx = random.choice(non_pref_indices)
+                old_doctor = current_assignment[idx]
                 
-                for d in self.all_dates:
-                    is_wh = d in self.weekends or d in self.holidays
-                    if not is_wh or d not in current_schedule:
+                # Find an evening preference doctor who's available and not already assigned
+                available_pref_docs = []
+                busy_mask = other_shift_masks[self.date_to_index[date]][self.shift_indices[shift]]
+                for doctor in evening_pref_names:
+                    # Skip if already in this shift (would cause duplicate)
+                    if doctor in current_assignment:
                         continue
-                    
-                    for s in self.shifts:
-                        if s not in current_schedule[d]:
-                            continue
                         
-                        # Find senior doctors in this shift
-                        seniors_in_shift = [i for i, doc in enumerate(current_schedule[d][s])
-                                        if doc in self.senior_doctors]
+                    # Skip if same as doctor being replaced (no-op)
+                    if doctor == old_doctor:
+                        continue
                         
-                        if seniors_in_shift:
-                            potential_moves.append((d, s, seniors_in_shift))
-                
-                if potential_moves:
-                    # Choose a date, shift, and senior doctor to replace
-                    date, shift, senior_indices = random.choice(potential_moves)
-                    idx = random.choice(senior_indices)
-                    old_doctor = current_schedule[date][shift][idx]
-                    
-                    # Find a junior doctor to replace the senior
-                    available_juniors = []
-                    for doctor in self.junior_doctors:
-                        # Skip if already in this shift (would cause duplicate)
-                        if doctor in current_schedule[date][shift]:
-                            continue
-                            
-                        # Skip if same as doctor being replaced (no-op)
-                        if doctor == old_doctor:
-                            continue
-                            
-                        # Check if available and not already assigned
-                        if not self._is_doctor_available(doctor, date, shift):
-                            continue
-                            
-                        already_assigned = False
-                        for other_shift in self.shifts:
-                            if other_shift == shift:
-                                continue
-                            if other_shift in current_schedule[date] and doctor in current_schedule[date][other_shift]:
-                                already_assigned = True
-                                break
+                    # Check if available and not already assigned to another shift that day
+                    if not self._is_doctor_available(doctor, date, shift):
+                        continue
                         
-                        if not already_assigned:
-                            available_juniors.append(doctor)
+                    already_assigned = busy_mask >> doctor_bits[doctor] & 1
                     
-                    if available_juniors:
-                        # Select a junior with lower weekend/holiday hours
-                        available_juniors.sort(key=lambda d: weekend_holiday_hours.get(d, 0))
-                        new_doctor = available_juniors[0] 
-                        move_successful = True
-                        # Check that this move doesn't create consecutive night shifts
-                        if shift == "Night" and new_doctor is not None:
-                            # Check if doctor worked night shift yesterday
-                            date_idx = self.all_dates.index(date)
-                            if date_idx > 0:
-                                prev_date = self.all_dates[date_idx - 1]
-                                if (prev_date in current_schedule and 
-                                    "Night" in current_schedule[prev_date] and 
-                                    new_doctor in current_schedule[prev_date]["Night"]):
-                                    move_successful = False  # Invalidate this move
-                            
-                            # Check if doctor would work night shift tomorrow
-                            if date_idx < len(self.all_dates) - 1:
-                                next_date = self.all_dates[date_idx + 1]
-                                if (next_date in current_schedule and 
-                                    "Night" in current_schedule[next_date] and 
-                                    new_doctor in current_schedule[next_date]["Night"]):
-                                    move_successful = False  # Invalidate this move
-            
-            # 3. Target monthly balance issues
-            elif move_type == "monthly_balance":
-                # Find doctors with highest and lowest monthly hours, excluding contract doctors and limited availability doctors
-                month_doctors = {doc: hrs.get(self.month, 0) for doc, hrs in monthly_hours.items() 
-                               if doc not in doctors_to_exclude}
+                    if not already_assigned:
+                        available_pref_docs.append(doctor)
+                
+                if available_pref_docs:
+                    # Choose the preference doctor who has the fewest preferred shifts so far
+                    cand_indices = np.fromiter((self.doctor_indices[d] for d in available_pref_docs),
+                                               dtype=np.int32, count=len(available_pref_docs))
+                    best_local = int(np.argmin(preference_satisfaction[cand_indices]))
+                    new_doctor = available_pref_docs[best_local]
+                    move_successful = True
+                    # Check that this move doesn't create consecutive night shifts
+                    if shift == "Night" and self._creates_consecutive_night(new_doctor, date, current_schedule):
+                        move_successful = False
+        
+        if move_successful:
+            return date, shift, idx, old_doctor, new_doctor
+        return None
+
+    def _move_senior_workload(self, current_schedule, state):
+        """Hand a senior's weekend/holiday shift to the junior with the fewest weekend/holiday hours."""
+        shift_masks = state["shift_masks"]
+        
+        # Most weekend/holiday shifts carry a senior, so try a few random ones first
+        # and only scan all of them when none of those yields a feasible move
+        if self.wh_date_list:
+            for _ in range(8):
+                d = random.choice(self.wh_date_list)
+                s = random.choice(self.shifts)
+                move = self._replace_senior_with_junior(current_schedule, state, d, s)
+                if move is not None:
+                    return move
+        
+        # Focus on weekend/holiday shifts with seniors
+        chosen_slot = None
+        candidate_count = 0
+        
+        for d in self.wh_date_list:
+            if d not in current_schedule:
+                continue
+            
+            d_idx = self.date_to_index[d]
+            for s_idx, s in enumerate(self.shifts):
+                if s not in current_schedule[d]:
+                    continue
                 
-                if month_doctors:
-                    # Sort doctors by hours in this month
-                    sorted_docs = sorted(month_doctors.items(), key=lambda x: x[1])
-                    
-                    if len(sorted_docs) >= 2:
-                        # Try to move hours from highest to lowest
-                        lowest_doc, lowest_hours = sorted_docs[0]
-                        highest_doc, highest_hours = sorted_docs[-1]
+                # Skip shifts without any senior
+                if not shift_masks[d_idx][s_idx] & self._senior_mask:
+                    continue
+                
+                candidate_count += 1
+                if random.random() * candidate_count < 1:
+                    chosen_slot = (d, s)
+        
+        if chosen_slot is not None:
+            return self._replace_senior_with_junior(current_schedule, state, *chosen_slot)
+        return None
+
+    def _replace_senior_with_junior(self, current_schedule, state, date, shift):
+        """Try to replace a random senior in date/shift with the junior with the fewest weekend/holiday hours."""
+        shift_doctors = current_schedule.get(date, {}).get(shift)
+        if shift_doctors is None:
+            return None
+        
+        d_idx = self.date_to_index[date]
+        s_idx = self.shift_indices[shift]
+        shift_mask = state["shift_masks"][d_idx][s_idx]
+        if not shift_mask & self._senior_mask:
+            return None
+        
+        # Choose a senior doctor to replace
+        senior_indices = [i for i, doc in enumerate(shift_doctors)
+                          if doc in self.senior_set]
+        idx = random.choice(senior_indices)
+        old_doctor = shift_doctors[idx]
+        
+        # Find available juniors who are not in this shift (would cause duplicate),
+        # not the doctor being replaced and not already assigned today
+        excluded_mask = shift_mask | state["other_shift_masks"][d_idx][s_idx] | 1 << state["doctor_bits"][old_doctor]
+        available_juniors = self._doctors_in_mask(self._junior_mask & self._available_masks[d_idx][s_idx] & ~excluded_mask)
+        if not available_juniors:
+            return None
+        
+        # Select a junior with lower weekend/holiday hours
+        weekend_holiday_hours = state["weekend_holiday_hours"]
+        new_doctor = min(available_juniors, key=weekend_holiday_hours.__getitem__)
+        
+        # Check that this move doesn't create consecutive night shifts
+        if shift == "Night" and self._creates_consecutive_night(new_doctor, date, current_schedule):
+            return None
+        return date, shift, idx, old_doctor, new_doctor
+
+    def _move_monthly_balance(self, current_schedule, state):
+        """Move a shift from the doctor with the most hours to one with fewer hours."""
+        monthly_hours = state["monthly_hours"]
+        doctors_to_exclude = state["doctors_to_exclude"]
+        other_shift_masks = state["other_shift_masks"]
+        doctor_bits = state["doctor_bits"]
+        doctor_assignments = state["doctor_assignments"]
+        date = None
+        shift = None
+        idx = None
+        old_doctor = None
+        new_doctor = None
+        move_successful = False
+        
+        # Find doctors with highest and lowest monthly hours, excluding contract doctors and limited availability doctors
+        month_doctors = {doc: hrs.get(self.month, 0) for doc, hrs in monthly_hours.items() 
+                       if doc not in doctors_to_exclude}
+        
+        if len(month_doctors) >= 2:
+            # Only the lowest half and the maximum are needed, so skip the full sort
+            lowest_half = heapq.nsmallest(len(month_doctors) // 2, month_doctors.items(), key=itemgetter(1))
+            
+            if lowest_half:
+                # Try to move hours from highest to lowest
+                lowest_doc, lowest_hours = lowest_half[0]
+                highest_doc, highest_hours = max(reversed(month_doctors.items()), key=itemgetter(1))
+                
+                # Only proceed if there's a significant gap
+                if highest_hours - lowest_hours >= 8:
+                    # Find a date where the highest doctor works
+                    chosen_move = None
+                    candidate_count = 0
+                    
+                    for (d, s), index in doctor_assignments[highest_doc].items():
+                        candidate_count += 1
+                        if random.random() * candidate_count < 1:
+                            chosen_move = (d, s, index)
+                    
+                    if chosen_move is not None:
+                        # Pick a move
+                        date, shift, idx = chosen_move
+                        old_doctor = highest_doc
                         
-                        # Only proceed if there's a significant gap
-                        if highest_hours - lowest_hours >= 8:
-                            # Find a date where the highest doctor works
-                            potential_moves = []
-                            
-                            for d in self.all_dates:
-                                if d not in current_schedule:
-                                    continue
-                                
-                                for s in self.shifts:
-                                    if s not in current_schedule[d]:
-                                        continue
-                                    
-                                    if highest_doc in current_schedule[d][s]:
-                                        # Found a shift where the highest doctor works
-                                        index = current_schedule[d][s].index(highest_doc)
-                                        potential_moves.append((d, s, index))
-                            
-                            if potential_moves:
-                                # Pick a move
-                                date, shift, idx = random.choice(potential_moves)
-                                old_doctor = highest_doc
-                                
-                                # Make sure the lowest doctor isn't already in this shift (would cause duplicate)
-                                current_shift_doctors = current_schedule[date][shift]
+                        # Make sure the lowest doctor isn't already in this shift (would cause duplicate)
+                        current_shift_doctors = current_schedule[date][shift]
+                        busy_mask = other_shift_masks[self.date_to_index[date]][self.shift_indices[shift]]
+                        
+                        if lowest_doc not in current_shift_doctors:
+                            # Check if the lowest doctor is available for this slot
+                            if self._is_doctor_available(lowest_doc, date, shift):
+                                # Check if they're not already assigned to another shift that day
+                                already_assigned = busy_mask >> doctor_bits[lowest_doc] & 1
                                 
-                                if lowest_doc not in current_shift_doctors:
-                                    # Check if the lowest doctor is available for this slot
-                                    if self._is_doctor_available(lowest_doc, date, shift):
-                                        # Check if they're not already assigned to another shift that day
-                                        already_assigned = False
-                                        for other_shift in self.shifts:
-                                            if other_shift == shift:
-                                                continue
-                                            if other_shift in current_schedule[date] and lowest_doc in current_schedule[date][other_shift]:
-                                                already_assigned = True
-                                                break
-                                        
-                                        if not already_assigned:
-                                            new_doctor = lowest_doc
-                                            move_successful = True
-                                        else:
-                                            # Find another doctor with low hours
-                                            available_docs = []
-                                            for doctor, hours in sorted_docs[:len(sorted_docs)//2]:  # Consider lowest half
-                                                # Skip if already in this shift (would cause duplicate)
-                                                if doctor in current_shift_doctors:
-                                                    continue
-                                                    
-                                                if doctor == old_doctor:
-                                                    continue
-                                                    
-                                                if not self._is_doctor_available(doctor, date, shift):
-                                                    continue
-                                                    
-                                                already_assigned = False
-                                                for other_shift in self.shifts:
-                                                    if other_shift == shift:
-                                                        continue
-                                                    if other_shift in current_schedule[date] and doctor in current_schedule[date][other_shift]:
-                                                        already_assigned = True
-                                                        break
-                                                    
-                                                if not already_assigned:
-                                                    available_docs.append(doctor)
+                                if not already_assigned:
+                                    new_doctor = lowest_doc
+                                    move_successful = True
+                                else:
+                                    # Find another doctor with low hours
+                                    available_docs = []
+                                    for doctor, hours in lowest_half:  # Consider lowest half
+                                        # Skip if already in this shift (would cause duplicate)
+                                        if doctor in current_shift_doctors:
+                                            continue
                                             
-                                            if available_docs:
-                                                new_doctor = random.choice(available_docs)
-                                                move_successful = True
-                                                # Check that this move doesn't create consecutive night shifts
-                                                if shift == "Night" and new_doctor is not None:
-                                                    # Check if doctor worked night shift yesterday
-                                                    date_idx = self.all_dates.index(date)
-                                                    if date_idx > 0:
-                                                        prev_date = self.all_dates[date_idx - 1]
-                                                        if (prev_date in current_schedule and 
-                                                            "Night" in current_schedule[prev_date] and 
-                                                            new_doctor in current_schedule[prev_date]["Night"]):
-                                                            move_successful = False  # Invalidate this move
-                                                    
-                                                    # Check if doctor would work night shift tomorrow
-                                                    if date_idx < len(self.all_dates) - 1:
-                                                        next_date = self.all_dates[date_idx + 1]
-                                                        if (next_date in current_schedule and 
-                                                            "Night" in current_schedule[next_date] and 
-                                                            new_doctor in current_schedule[next_date]["Night"]):
-                                                            move_successful = False  # Invalidate this move
-                    
-            # 4. Weekend/Holiday balance move
-            elif move_type == "weekend_holiday_balance":
-                # Calculate current weekend/holiday hours for all doctors
-                wh_hours = weekend_holiday_hours
-                
-                # Sort doctors by weekend/holiday hours (within their seniority group), excluding doctors with limited availability
-                junior_wh = [(doc, wh_hours.get(doc, 0)) for doc in self.junior_doctors 
-                            if doc not in doctors_to_exclude]
-                senior_wh = [(doc, wh_hours.get(doc, 0)) for doc in self.senior_doctors 
-                            if doc not in doctors_to_exclude]
-                
-                junior_wh.sort(key=lambda x: x[1])  # Sort by hours (ascending)
-                senior_wh.sort(key=lambda x: x[1])  # Sort by hours (ascending)
-                
-                # Try to find a weekend/holiday shift to move from highest to lowest
-                potential_moves = []
-                
-                # 1. First try to balance juniors
-                if len(junior_wh) >= 2 and junior_wh[-1][1] - junior_wh[0][1] > 16:
-                    highest_doc, highest_hours = junior_wh[-1]
-                    lowest_doc, lowest_hours = junior_wh[0]
+                                        if doctor == old_doctor:
+                                            continue
+                                            
+                                        if not self._is_doctor_available(doctor, date, shift):
+                                            continue
+                                            
+                                        already_assigned = busy_mask >> doctor_bits[doctor] & 1
+                                            
+                                        if not already_assigned:
+                                            available_docs.append(doctor)
+                                    
+                                    if available_docs:
+                                        new_doctor = random.choice(available_docs)
+                                        move_successful = True
+                                        # Check that this move doesn't create consecutive night shifts
+                                        if shift == "Night" and self._creates_consecutive_night(new_doctor, date, current_schedule):
+                                            move_successful = False
+        
+        if move_successful:
+            return date, shift, idx, old_doctor, new_doctor
+        return None
+
+    def _move_weekend_holiday_balance(self, current_schedule, state):
+        """Rebalance weekend/holiday shifts within and between seniority groups."""
+        doctors_to_exclude = state["doctors_to_exclude"]
+        weekend_holiday_hours = state["weekend_holiday_hours"]
+        other_shift_masks = state["other_shift_masks"]
+        doctor_bits = state["doctor_bits"]
+        contract_doctors = state["contract_doctors"]
+        schedule_index = state["schedule_index"]
+        doctor_assignments = state["doctor_assignments"]
+        date = None
+        shift = None
+        idx = None
+        old_doctor = None
+        new_doctor = None
+        move_successful = False
+        
+        # Calculate current weekend/holiday hours for all doctors
+        wh_hours = weekend_holiday_hours
+        
+        # Weekend/holiday hours within each seniority group, excluding doctors with limited availability
+        junior_wh = [(doc, wh_hours.get(doc, 0)) for doc in self.junior_doctors 
+                    if doc not in doctors_to_exclude]
+        senior_wh = [(doc, wh_hours.get(doc, 0)) for doc in self.senior_doctors 
+                    if doc not in doctors_to_exclude]
+        
+        # Only the extremes of each group are needed, so the lists are left unsorted
+        hours_key = itemgetter(1)
+        
+        # Try to find a weekend/holiday shift to move from highest to lowest
+        chosen_move = None
+        candidate_count = 0
+        
+        # 1. First try to balance juniors
+        if len(junior_wh) >= 2:
+            lowest_doc, lowest_hours = min(junior_wh, key=hours_key)
+            highest_doc, highest_hours = max(reversed(junior_wh), key=hours_key)
+            
+            if highest_hours - lowest_hours > 16:
+                # Find weekend/holiday shifts where the highest doctor works
+                for (d, s), index in doctor_assignments[highest_doc].items():
+                    if d not in self.wh_dates:
+                        continue
+                    candidate_count += 1
+                    if random.random() * candidate_count < 1:
+                        chosen_move = (d, s, index, highest_doc, lowest_doc)
+        
+        # 2. Then try to balance seniors
+        if len(senior_wh) >= 2:
+            lowest_doc, lowest_hours = min(senior_wh, key=hours_key)
+            highest_doc, highest_hours = max(reversed(senior_wh), key=hours_key)
+            
+            if highest_hours - lowest_hours > 16:
+                # Find weekend/holiday shifts where the highest doctor works
+                for (d, s), index in doctor_assignments[highest_doc].items():
+                    if d not in self.wh_dates:
+                        continue
+                    candidate_count += 1
+                    if random.random() * candidate_count < 1:
+                        chosen_move = (d, s, index, highest_doc, lowest_doc)
+        
+        # 3. Finally, ensure proper junior/senior split
+        if junior_wh and senior_wh:
+            # Calculate averages, excluding contract doctors
+            avg_junior = sum(hrs for _, hrs in junior_wh) / len(junior_wh) if junior_wh else 0
+            avg_senior = sum(hrs for _, hrs in senior_wh) / len(senior_wh) if senior_wh else 0
+            
+            # If seniors are working too much compared to juniors
+            if avg_senior > avg_junior:
+                # Find a weekend/holiday where a senior works and replace with a junior
+                shifts = self.shifts
+                senior_set = self.senior_set
+                for d in self.wh_date_list:
+                    day = current_schedule.get(d)
+                    if not day:
+                        continue
                     
-                    # Find weekend/holiday shifts where the highest doctor works
-                    for d in self.all_dates:
-                        is_wh = d in self.weekends or d in self.holidays
-                        if not is_wh or d not in current_schedule:
+                    for s in shifts:
+                        shift_doctors = day.get(s)
+                        if shift_doctors is None:
                             continue
                         
-                        for s in self.shifts:
-                            if s not in current_schedule[d]:
-                                continue
+                        # Reservoir-sample one senior in this shift without building a list
+                        senior_pick = None
+                        senior_count = 0
+                        for i, doc in enumerate(shift_doctors):
+                            if doc in senior_set and doc not in contract_doctors:
+                                senior_count += 1
+                                if random.random() * senior_count < 1:
+                                    senior_pick = (i, doc)
+                        
+                        if senior_pick is not None:
+                            index, senior_doc = senior_pick
+                            # Find the junior with the lowest hours that is not in this shift
+                            shift_index = schedule_index[d][s]
+                            lowest_junior = min((doc for doc in junior_wh if doc[0] not in shift_index),
+                                                key=hours_key, default=None)
                             
-                            if highest_doc in current_schedule[d][s]:
-                                index = current_schedule[d][s].index(highest_doc)
-                                potential_moves.append((d, s, index, highest_doc, lowest_doc))
-                
-                # 2. Then try to balance seniors
-                if len(senior_wh) >= 2 and senior_wh[-1][1] - senior_wh[0][1] > 16:
-                    highest_doc, highest_hours = senior_wh[-1]
-                    lowest_doc, lowest_hours = senior_wh[0]
-                    
-                    # Find weekend/holiday shifts where the highest doctor works
-                    for d in self.all_dates:
-                        is_wh = d in self.weekends or d in self.holidays
-                        if not is_wh or d not in current_schedule:
-                            continue
+                            if lowest_junior is not None:
+                                junior_doc = lowest_junior[0]  # Junior with lowest hours
+                                candidate_count += 1
+                                if random.random() * candidate_count < 1:
+                                    chosen_move = (d, s, index, senior_doc, junior_doc)
+            
+            elif avg_senior < avg_junior * 0.7:  # Seniors have less than 70% of junior hours
+                # Find weekend/holiday shifts for juniors with highest hours
+                # Ensure we're only considering non-contract doctors
+                if junior_wh:
+                    junior_with_most = max(junior_wh, key=hours_key)[0]
+                    
+                    # Look for shifts to transfer to seniors with lowest hours
+                    if senior_wh:
+                        senior_with_least = min(senior_wh, key=hours_key)[0]
                         
-                        for s in self.shifts:
-                            if s not in current_schedule[d]:
+                        for (d, s), index in doctor_assignments[junior_with_most].items():
+                            if d not in self.wh_dates:
                                 continue
                             
-                            if highest_doc in current_schedule[d][s]:
-                                index = current_schedule[d][s].index(highest_doc)
-                                potential_moves.append((d, s, index, highest_doc, lowest_doc))
+                            # Skip if senior already in this shift (would cause duplicate)
+                            if senior_with_least not in schedule_index[d][s]:
+                                candidate_count += 1
+                                if random.random() * candidate_count < 1:
+                                    chosen_move = (d, s, index, junior_with_most, senior_with_least)
+        
+        if chosen_move is not None:
+            # Choose one of the potential moves
+            date, shift, idx, old_doctor, new_doctor = chosen_move
+            busy_mask = other_shift_masks[self.date_to_index[date]][self.shift_indices[shift]]
+            
+            # Check if the replacement doctor is available
+            if self._is_doctor_available(new_doctor, date, shift):
+                # Check if already assigned to another shift that day
+                already_assigned = busy_mask >> doctor_bits[new_doctor] & 1
                 
-                # 3. Finally, ensure proper junior/senior split
-                if junior_wh and senior_wh:
-                    # Calculate averages, excluding contract doctors
-                    avg_junior = sum(hrs for _, hrs in junior_wh) / len(junior_wh) if junior_wh else 0
-                    avg_senior = sum(hrs for _, hrs in senior_wh) / len(senior_wh) if senior_wh else 0
-                    
-                    # If seniors are working too much compared to juniors
-                    if avg_senior > avg_junior:
-                        # Find a weekend/holiday where a senior works and replace with a junior
-                        for d in self.all_dates:
-                            is_wh = d in self.weekends or d in self.holidays
-                            if not is_wh or d not in current_schedule:
-                                continue
-                            
-                            for s in self.shifts:
-                                if s not in current_schedule[d]:
-                                    continue
-                                
-                                senior_indices = [(i, doc) for i, doc in enumerate(current_schedule[d][s]) 
-                                                if doc in self.senior_doctors and doc not in contract_doctors]
-                                
-                                if senior_indices:
-                                    index, senior_doc = random.choice(senior_indices)
-                                    # Find junior doctors that are not contract doctors
-                                    available_juniors = [doc[0] for doc in junior_wh if doc[0] not in current_schedule[d][s]]
-                                    
-                                    if available_juniors:
-                                        junior_doc = available_juniors[0]  # Junior with lowest hours
-                                        potential_moves.append((d, s, index, senior_doc, junior_doc))
-                    
-                    elif avg_senior < avg_junior * 0.7:  # Seniors have less than 70% of junior hours
-                        # Find weekend/holiday shifts for juniors with highest hours
-                        # Ensure we're only considering non-contract doctors
-                        if junior_wh:
-                            junior_with_most = max(junior_wh, key=lambda x: x[1])[0]
-                            
-                            # Look for shifts to transfer to seniors with lowest hours
-                            if senior_wh:
-                                senior_with_least = min(senior_wh, key=lambda x: x[1])[0]
-                                
-                                for d in self.all_dates:
-                                    is_wh = d in self.weekends or d in self.holidays
-                                    if not is_wh or d not in current_schedule:
-                                        continue
-                                    
-                                    for s in self.shifts:
-                                        if s not in current_schedule[d]:
-                                            continue
-                                        
-                                        # Skip if senior already in this shift (would cause duplicate)
-                                        if senior_with_least not in current_schedule[d][s] and junior_with_most in current_schedule[d][s]:
-                                            index = current_schedule[d][s].index(junior_with_most)
-                                            potential_moves.append((d, s, index, junior_with_most, senior_with_least))
-                
-                if potential_moves:
-                    # Choose one of the potential moves
-                    date, shift, idx, old_doctor, new_doctor = random.choice(potential_moves)
-                    
-                    # Check if the replacement doctor is available
-                    if self._is_doctor_available(new_doctor, date, shift):
-                        # Check if already assigned to another shift that day
-                        already_assigned = False
-                        for other_shift in self.shifts:
-                            if other_shift == shift:
-                                continue
-                            if other_shift in current_schedule[date] and new_doctor in current_schedule[date][other_shift]:
-                                already_assigned = True
-                                break
-                        
-                        if not already_assigned:
-                            move_successful = True
-                            # Check that this move doesn't create consecutive night shifts
-                            if shift == "Night" and new_doctor is not None:
-                                # Check if doctor worked night shift yesterday
-                                date_idx = self.all_dates.index(date)
-                                if date_idx > 0:
-                                    prev_date = self.all_dates[date_idx - 1]
-                                    if (prev_date in current_schedule and 
-                                        "Night" in current_schedule[prev_date] and 
-                                        new_doctor in current_schedule[prev_date]["Night"]):
-                                        move_successful = False  # Invalidate this move
-                                
-                                # Check if doctor would work night shift tomorrow
-                                if date_idx < len(self.all_dates) - 1:
-                                    next_date = self.all_dates[date_idx + 1]
-                                    if (next_date in current_schedule and 
-                                        "Night" in current_schedule[next_date] and 
-                                        new_doctor in current_schedule[next_date]["Night"]):
-                                        move_successful = False  # Invalidate this move
-            
-            # 5. Consecutive days move - try to fix doctors working too many consecutive days
-            elif move_type == "consecutive_days":
-                # Find doctors who are exceeding consecutive day limit
-                overworked_doctors = []
+                if not already_assigned:
+                    move_successful = True
+                    # Check that this move doesn't create consecutive night shifts
+                    if shift == "Night" and self._creates_consecutive_night(new_doctor, date, current_schedule):
+                        move_successful = False
+        
+        if move_successful:
+            return date, shift, idx, old_doctor, new_doctor
+        return None
+
+    def _move_consecutive_days(self, current_schedule, state):
+        """Replace a doctor who exceeds the consecutive working day limit."""
+        consecutive_days = state["consecutive_days"]
+        other_shift_masks = state["other_shift_masks"]
+        doctor_bits = state["doctor_bits"]
+        schedule_index = state["schedule_index"]
+        doctor_assignments = state["doctor_assignments"]
+        date = None
+        shift = None
+        idx = None
+        old_doctor = None
+        new_doctor = None
+        move_successful = False
+        
+        # Find doctors who are exceeding consecutive day limit
+        overworked_doctors = []
+        for doctor, days in consecutive_days.items():
+            if days > self.max_consecutive_shifts:
+                overworked_doctors.append((doctor, days))
+        
+        # Sort by most consecutive days first
+        overworked_doctors.sort(key=itemgetter(1), reverse=True)
+        
+        if overworked_doctors:
+            # Get the doctor with the most consecutive days
+            overworked_doc, _ = overworked_doctors[0]
+            
+            # Find a date where this doctor is working to replace them
+            chosen_move = None
+            candidate_count = 0
+            
+            for (d, s), index in doctor_assignments[overworked_doc].items():
+                candidate_count += 1
+                if random.random() * candidate_count < 1:
+                    chosen_move = (d, s, index)
+            
+            if chosen_move is not None:
+                # Choose a move
+                date, shift, idx = chosen_move
+                old_doctor = overworked_doc
+                
+                # Find doctors who haven't been working consecutive days
+                rested_doctors = []
+                busy_mask = other_shift_masks[self.date_to_index[date]][self.shift_indices[shift]]
+                shift_index = schedule_index[date][shift]
                 for doctor, days in consecutive_days.items():
-                    if days > self.max_consecutive_shifts:
-                        overworked_doctors.append((doctor, days))
-                
-                # Sort by most consecutive days first
-                overworked_doctors.sort(key=lambda x: x[1], reverse=True)
-                
-                if overworked_doctors:
-                    # Get the doctor with the most consecutive days
-                    overworked_doc, _ = overworked_doctors[0]
-                    
-                    # Find a date where this doctor is working to replace them
-                    potential_moves = []
-                    
-                    for d in self.all_dates:
-                        if d not in current_schedule:
+                    if days <= 2 and doctor != old_doctor:  # Well rested doctors
+                        # Skip if already in this shift (would cause duplicate)
+                        if doctor in shift_index:
                             continue
                             
-                        for s in self.shifts:
-                            if s not in current_schedule[d]:
-                                continue
-                                
-                            if overworked_doc in current_schedule[d][s]:
-                                index = current_schedule[d][s].index(overworked_doc)
-                                potential_moves.append((d, s, index))
-                    
-                    if potential_moves:
-                        # Choose a move
-                        date, shift, idx = random.choice(potential_moves)
-                        old_doctor = overworked_doc
-                        
-                        # Find doctors who haven't been working consecutive days
-                        rested_doctors = []
-                        for doctor, days in consecutive_days.items():
-                            if days <= 2 and doctor != old_doctor:  # Well rested doctors
-                                # Skip if already in this shift (would cause duplicate)
-                                if doctor in current_schedule[date][shift]:
-                                    continue
+                        if self._is_doctor_available(doctor, date, shift):
+                            # Check if not already assigned another shift that day
+                            already_assigned = busy_mask >> doctor_bits[doctor] & 1
                                     
-                                if self._is_doctor_available(doctor, date, shift):
-                                    # Check if not already assigned another shift that day
-                                    already_assigned = False
-                                    for other_shift in self.shifts:
-                                        if other_shift == shift:
-                                            continue
-                                        if (other_shift in current_schedule[date] and 
-                                            doctor in current_schedule[date][other_shift]):
-                                            already_assigned = True
-                                            break
-                                            
-                                    if not already_assigned:
-                                        rested_doctors.append(doctor)
-                        
-                        if rested_doctors:
-                            # Choose a rested doctor
-                            new_doctor = random.choice(rested_doctors)
-                            move_successful = True
-            
-            # 6. Random move as fallback
-            else:
-                # Select a random date and shift
-                date = random.choice(self.all_dates)
-                shift = random.choice(self.shifts)
-                
-                # Skip if date or shift not in schedule
-                if date in current_schedule and shift in current_schedule[date]:
-                    current_assignment = current_schedule[date][shift]
-                    if current_assignment:
-                        # Select a random doctor to replace
-                        idx = random.randint(0, len(current_assignment) - 1)
-                        old_doctor = current_assignment[idx]
-                        
-                        # Find all available doctors for this shift who aren't already assigned on this date
-                        available_doctors = set()
-                        for doctor in [doc["name"] for doc in self.doctors]:
-                            # Skip if already in this shift (would cause duplicate)
-                            if doctor in current_assignment:
-                                continue
-                                
-                            # Check if doctor is available for this shift
-                            if not self._is_doctor_available(doctor, date, shift):
-                                continue
-                            
-                            # Check preference compatibility with shift
-                            if not self._can_assign_to_shift(doctor, shift):
-                                continue
-                                
-                            # CRUCIAL: For Night shifts, check for consecutive assignments
-                            if shift == "Night":
-                                # Check if doctor worked night shift yesterday
-                                date_idx = self.all_dates.index(date)
-                                if date_idx > 0:
-                                    prev_date = self.all_dates[date_idx - 1]
-                                    if (prev_date in current_schedule and 
-                                        "Night" in current_schedule[prev_date] and 
-                                        doctor in current_schedule[prev_date]["Night"]):
-                                        continue  # Skip this doctor
-                                
-                                # Also check if doctor is already scheduled for tomorrow's night shift
-                                if date_idx < len(self.all_dates) - 1:
-                                    next_date = self.all_dates[date_idx + 1]
-                                    if (next_date in current_schedule and 
-                                        "Night" in current_schedule[next_date] and 
-                                        doctor in current_schedule[next_date]["Night"]):
-                                        continue  # Skip this doctor
-                            
-                            # Check if doctor is available for this shift
-                            if not self._is_doctor_available(doctor, date, shift):
-                                continue
-                            
-                            # Check if doctor is already assigned to another shift on this date
-                            already_assigned = False
-                            for other_shift in self.shifts:
-                                if other_shift == shift:
-                                    continue
-                                if other_shift in current_schedule[date] and doctor in current_schedule[date][other_shift]:
-                                    already_assigned = True
-                                    break
-                            
                             if not already_assigned:
-                                available_doctors.add(doctor)
-                        
-                        # If no available replacements, try another move
-                        if available_doctors:
-                            # Select a random available doctor as replacement
-                            new_doctor = random.choice(list(available_doctors))
-                            move_successful = True
-                            # Check that this move doesn't create consecutive night shifts
-                            if shift == "Night" and new_doctor is not None:
-                                # Check if doctor worked night shift yesterday
-                                date_idx = self.all_dates.index(date)
-                                if date_idx > 0:
-                                    prev_date = self.all_dates[date_idx - 1]
-                                    if (prev_date in current_schedule and 
-                                        "Night" in current_schedule[prev_date] and 
-                                        new_doctor in current_schedule[prev_date]["Night"]):
-                                        move_successful = False  # Invalidate this move
-                                
-                                # Check if doctor would work night shift tomorrow
-                                if date_idx < len(self.all_dates) - 1:
-                                    next_date = self.all_dates[date_idx + 1]
-                                    if (next_date in current_schedule and 
-                                        "Night" in current_schedule[next_date] and 
-                                        new_doctor in current_schedule[next_date]["Night"]):
-                                        move_successful = False  # Invalidate this move
-
-                            # Check that this move doesn't create consecutive night shifts
-                            if shift == "Night" and new_doctor is not None:
-                                # Check if doctor worked night shift yesterday
-                                date_idx = self.all_dates.index(date)
-                                if date_idx > 0:
-                                    prev_date = self.all_dates[date_idx - 1]
-                                    if (prev_date in current_schedule and 
-                                        "Night" in current_schedule[prev_date] and 
-                                        new_doctor in current_schedule[prev_date]["Night"]):
-                                        move_successful = False  # Invalidate this move
-                                
-                                # Check if doctor would work night shift tomorrow
-                                if date_idx < len(self.all_dates) - 1:
-                                    next_date = self.all_dates[date_idx + 1]
-                                    if (next_date in current_schedule and 
-                                        "Night" in current_schedule[next_date] and 
-                                        new_doctor in current_schedule[next_date]["Night"]):
-                                        move_successful = False  # Invalidate this move
-            
-            # Create a new schedule only if all variables are properly set and the move was successful
-            if move_successful and date is not None and shift is not None and idx is not None and old_doctor is not None and new_doctor is not None:
-                # Create new schedule with the selected move (using helper function)
-                new_schedule = self._create_new_schedule(current_schedule, date, shift, idx, old_doctor, new_doctor)
+                                rested_doctors.append(doctor)
                 
-                # Record the move
-                move = (date, shift, old_doctor, new_doctor)
-                neighbors.append((new_schedule, move))
+                if rested_doctors:
+                    # Choose a rested doctor
+                    new_doctor = random.choice(rested_doctors)
+                    move_successful = True
         
-        # If we couldn't generate enough smart moves, fall back to random ones
-        fallback_attempts = 0
-        max_fallback_attempts = num_moves * 10  # Limit attempts to avoid infinite loop
-        while len(neighbors) < num_moves and fallback_attempts < max_fallback_attempts:
-            fallback_attempts += 1
-            # Keep trying until we get enough neighbors or reach max attempts
-            random_neighbor = self._get_random_neighbor(current_schedule)
-            if random_neighbor:
-                neighbors.append(random_neighbor)
+        if move_successful:
+            return date, shift, idx, old_doctor, new_doctor
+        return None
+
+    def _move_random(self, current_schedule, state):
+        """Replace a random doctor with any compatible available doctor."""
+        other_shift_masks = state["other_shift_masks"]
+        doctor_bits = state["doctor_bits"]
+        date = None
+        shift = None
+        idx = None
+        old_doctor = None
+        new_doctor = None
+        move_successful = False
+        
+        # Select a random date and shift
+        date, shift, slot_draw = self._draw_random_slot()
+        
+        # Skip if date or shift not in schedule
+        current_assignment = current_schedule.get(date, {}).get(shift)
+        if current_assignment:
+            # Select a random doctor to replace
+            idx = int(slot_draw * len(current_assignment))
+            old_doctor = current_assignment[idx]
+            
+            # Reservoir-sample one available doctor for this shift who isn't already assigned on this date
+            chosen_doctor = None
+            candidate_count = 0
+            busy_mask = other_shift_masks[self.date_to_index[date]][self.shift_indices[shift]]
+            for doctor in self.doctor_names:
+                # Skip if already in this shift (would cause duplicate)
+                if doctor in current_assignment:
+                    continue
                 
-        return neighbors
+                # Check preference compatibility with shift
+                if not self._can_assign_to_shift(doctor, shift):
+                    continue
+                    
+                # CRUCIAL: For Night shifts, check for consecutive assignments
+                if shift == "Night" and self._creates_consecutive_night(doctor, date, current_schedule):
+                    continue  # Skip this doctor
+                
+                # Check if doctor is available for this shift
+                if not self._is_doctor_available(doctor, date, shift):
+                    continue
+                
+                # Check if doctor is already assigned to another shift on this date
+                already_assigned = busy_mask >> doctor_bits[doctor] & 1
+                
+                if not already_assigned:
+                    candidate_count += 1
+                    if random.random() * candidate_count < 1:
+                        chosen_doctor = doctor
+            
+            # If no available replacements, try another move
+            if chosen_doctor is not None:
+                # Use the sampled available doctor as replacement
+                new_doctor = chosen_doctor
+                move_successful = True
+
+        if move_successful:
+            return date, shift, idx, old_doctor, new_doctor
+        return None
+
+    def _draw_random_slot(self):
+        """
+        Draw a random (date, shift, u) triple, u uniform in [0, 1) for picking a position.
+        
+        Draws are generated in batches with random.choices so the random moves
+        don't pay the per-call overhead of random.choice/random.randint.
+        """
+        if not self._random_slot_pool:
+            batch_size = 1024
+            self._random_slot_pool = list(zip(
+                random.choices(self.all_dates, k=batch_size),
+                random.choices(self.shifts, k=batch_size),
+                [random.random() for _ in range(batch_size)]
+            ))
+        return self._random_slot_pool.pop()
+
+    def _creates_consecutive_night(self, doctor, date, current_schedule):
+        """
+        Check whether doctor already works the Night shift the day before or after date.
+        
+        current_schedule must be the tracked schedule: the check reads the Night
+        bits of the neighbouring dates from self._shift_masks.
+        """
+        d_idx = self.date_to_index[date]
+        night_idx = self.shift_indices["Night"]
+        shift_masks = self._shift_masks
+        adjacent_nights = 0
+        if d_idx > 0:
+            adjacent_nights |= shift_masks[d_idx - 1][night_idx]
+        if d_idx + 1 < len(shift_masks):
+            adjacent_nights |= shift_masks[d_idx + 1][night_idx]
+        return bool(adjacent_nights >> self.doctor_indices[doctor] & 1)
+
+    def _copy_schedule(self, schedule):
+        """Copy the date/shift structure of schedule so the copy shares no mutable containers."""
+        return {date: {shift: list(doctors) for shift, doctors in shifts.items()}
+                for date, shifts in schedule.items()}
+
     def _create_new_schedule(self, current_schedule, date, shift, idx, old_doctor, new_doctor):
         """
-        Create a new schedule by applying a move:
+        Create a new schedule by applying a move (see _moved_shift_doctors).
+        
+        Returns the new schedule.
+        """
+        # Copy only the path to the changed cell: the outer dict, this date's
+        # shift dict and this shift's doctor list. Every other date and shift
+        # is shared with current_schedule, which is never mutated in place.
+        new_schedule = current_schedule.copy()
+        new_schedule[date] = dict(current_schedule.get(date, ()))
+        new_schedule[date][shift] = self._moved_shift_doctors(
+            new_schedule[date].get(shift, ()), date, shift, idx, old_doctor, new_doctor)
+        return new_schedule
+
+    def _moved_shift_doctors(self, shift_doctors, date, shift, idx, old_doctor, new_doctor):
+        """
+        Return a new list of the doctors of date/shift after applying a move:
         1. Replace a doctor at a specific index
         2. Add a doctor if idx is -1
         3. Remove a doctor if new_doctor is None
         
-        Returns the new schedule.
+        Moves that cannot be applied leave the doctors unchanged.
         """
-        # Create a deep copy of the current schedule
-        new_schedule = copy.deepcopy(current_schedule)
-        
-        # If the date doesn't exist in the schedule, create it
-        if date not in new_schedule:
-            new_schedule[date] = {}
-        
-        # If the shift doesn't exist for this date, create it
-        if shift not in new_schedule[date]:
-            new_schedule[date][shift] = []
+        new_doctors = list(shift_doctors)
         
         # Special case: adding a new doctor (idx = -1)
         if idx == -1 and new_doctor is not None:
             # NEW: Before adding, check if we would exceed the required number
-            # Get required slots from template or default requirements
-            required_slots = self.shift_requirements[shift]  # Default
-            if hasattr(self, 'shift_template') and date in self.shift_template and shift in self.shift_template[date]:
-                required_slots = self.shift_template[date][shift].get('slots', self.shift_requirements[shift])
+            required_slots = int(self._slot_limits[self.date_to_index[date], self.shift_indices[shift]])
             
             # Check if adding would exceed the required slots
-            current_slots = len(new_schedule[date][shift])
+            current_slots = len(new_doctors)
             if current_slots >= required_slots:
-                logger.warning(f"Not adding doctor {new_doctor} to {date}, {shift} - would exceed required slots ({required_slots})")
-                return new_schedule  # Return without making changes
+                logger.warning("Not adding doctor %s to %s, %s - would exceed required slots (%s)",
+                               new_doctor, date, shift, required_slots)
+                return new_doctors  # Return without making changes
             
-            new_schedule[date][shift].append(new_doctor)
-            return new_schedule
+            new_doctors.append(new_doctor)
+            return new_doctors
         
         # Special case: removing a doctor (new_doctor is None)
         if old_doctor is not None and new_doctor is None:
-            try:
-                # Find the doctor to remove
-                if old_doctor in new_schedule[date][shift]:
-                    new_schedule[date][shift].remove(old_doctor)
-            except (KeyError, ValueError):
-                # Doctor not found or other error
-                pass
-            return new_schedule
+            # Find the doctor to remove
+            if old_doctor in new_doctors:
+                new_doctors.remove(old_doctor)
+            return new_doctors
         
         # Normal case: replacing a doctor
         if old_doctor is not None and new_doctor is not None:
             # First verify the doctor is in the list
-            if old_doctor not in new_schedule[date][shift]:
+            if old_doctor not in new_doctors:
                 # Something went wrong - doctor not in the shift
-                logger.warning(f"Doctor {old_doctor} not found in {date}, {shift} for replacement")
-                return new_schedule
+                logger.warning("Doctor %s not found in %s, %s for replacement", old_doctor, date, shift)
+                return new_doctors
             
-            # Use list comprehension for cleaner replacement while ensuring no duplicates
-            already_in_shift = new_doctor in new_schedule[date][shift]
+            # Make sure the replacement does not create a duplicate
+            already_in_shift = new_doctor in new_doctors
             if already_in_shift:
                 # Would create duplicate - abort
-                logger.warning(f"Not replacing {old_doctor} with {new_doctor} in {date}, {shift} - would create duplicate")
-                return new_schedule
+                logger.warning("Not replacing %s with %s in %s, %s - would create duplicate",
+                               old_doctor, new_doctor, date, shift)
+                return new_doctors
             
-            # Replace the doctor
-            new_schedule[date][shift] = [new_doctor if d == old_doctor else d for d in new_schedule[date][shift]]
+            # Replace the doctor in place; new_doctors is already a fresh list
+            new_doctors[new_doctors.index(old_doctor)] = new_doctor
             
-        return new_schedule
+        return new_doctors
 
-    def _calculate_consecutive_days(self, schedule):
-        """Calculate consecutive working days for each doctor."""
-        doctor_names = [doc["name"] for doc in self.doctors]
+    def _calculate_consecutive_days(self, schedule, day_masks=None):
+        """
+        Calculate consecutive working days for each doctor.
+        
+        day_masks are the per-date "assigned today" doctor bitmasks of schedule
+        (see _build_schedule_masks); they are built here when not supplied.
+        """
+        doctor_names = self.doctor_names
         consecutive_days = {doctor: 0 for doctor in doctor_names}
+        if day_masks is None:
+            _, day_masks, _ = self._build_schedule_masks(schedule)
         
         # Track last day a doctor worked
         last_worked = {doctor: None for doctor in doctor_names}
-        
-        # Process dates in order
-        for date in sorted(self.all_dates):
-            # Find doctors working today
-            working_today = set()
-            if date in schedule:
-                for shift in self.shifts:
-                    if shift in schedule[date]:
-                        working_today.update(schedule[date][shift])
-            
-            # Update consecutive days for each doctor
-            for doctor in doctor_names:
-                if doctor in working_today:
-                    if last_worked[doctor] is not None:
-                        # Check if this is a consecutive day
-                        last_date = datetime.date.fromisoformat(last_worked[doctor])
-                        current_date = datetime.date.fromisoformat(date)
-                        
-                        if (current_date - last_date).days == 1:
-                            consecutive_days[doctor] += 1
-                        else:
-                            consecutive_days[doctor] = 1
+        date_ordinals = self.date_ordinals
+        
+        # Process dates in order (self.all_dates is generated in date order)
+        for date_idx, date in enumerate(self.all_dates):
+            # Update consecutive days for each doctor working today
+            for doctor in self._doctors_in_mask(day_masks[date_idx]):
+                if last_worked[doctor] is not None:
+                    # Check if this is a consecutive day
+                    if date_ordinals[date] - date_ordinals[last_worked[doctor]] == 1:
+                        consecutive_days[doctor] += 1
                     else:
                         consecutive_days[doctor] = 1
-                        
-                    last_worked[doctor] = date
+                else:
+                    consecutive_days[doctor] = 1
+                    
+                last_worked[doctor] = date
         
         return consecutive_days
 
-    def _get_random_neighbor(self, current_schedule):
-        """Helper function to get a random neighbor as fallback. Always performs swaps, never just removals."""
+    def _get_random_move(self, current_schedule):
+        """Helper function to get a random move as fallback. Always performs swaps, never just removals."""
         attempts = 0
         while attempts < 20:  # Limit attempts
             attempts += 1
             
             # Select a random date and shift
-            date = random.choice(self.all_dates)
-            shift = random.choice(self.shifts)
+            date, shift, slot_draw = self._draw_random_slot()
             
             # Skip if date or shift not in schedule
             if date not in current_schedule or shift not in current_schedule[date]:
@@ -2414,91 +2598,32 @@ class MonthlyScheduleOptimizer:
                 continue
                 
             # Select a random doctor to replace
-            idx = random.randint(0, len(current_assignment) - 1)
+            idx = int(slot_draw * len(current_assignment))
             old_doctor = current_assignment[idx]
             
-            # Find available replacements
-            available_doctors = []
-            for doctor in [doc["name"] for doc in self.doctors]:
-                if doctor == old_doctor:
-                    continue
-                    
-                # Skip if already in this shift (would cause duplicate)
-                if doctor in current_assignment:
-                    continue
-                    
-                if not self._is_doctor_available(doctor, date, shift):
-                    continue
-                    
-                # NEW: Check preference compatibility with shift
-                if not self._can_assign_to_shift(doctor, shift):
-                    continue
-                    
-                already_assigned = False
-                for other_shift in self.shifts:
-                    if other_shift == shift:
-                        continue
-                    if other_shift in current_schedule[date] and doctor in current_schedule[date][other_shift]:
-                        already_assigned = True
-                        break
-                        
-                if not already_assigned:
-                    available_doctors.append(doctor)
-            
-            # If no available doctors found, try doctors with less strict requirements
-            if not available_doctors:
-                # Try doctors regardless of preference compatibility
-                for doctor in [doc["name"] for doc in self.doctors]:
-                    if doctor == old_doctor:
-                        continue
-                    
-                    # Skip if already in this shift (would cause duplicate)
-                    if doctor in current_assignment:
-                        continue
-                    
-                    if not self._is_doctor_available(doctor, date, shift):
-                        continue
-                    
-                    already_assigned = False
-                    for other_shift in self.shifts:
-                        if other_shift == shift:
-                            continue
-                        if other_shift in current_schedule[date] and doctor in current_schedule[date][other_shift]:
-                            already_assigned = True
-                            break
-                    
-                    if not already_assigned:
-                        available_doctors.append(doctor)
+            # Available doctors not already in this shift (would cause duplicate);
+            # old_doctor is in the shift, so this also leaves them out
+            d_idx = self.date_to_index[date]
+            s_idx = self.shift_indices[shift]
+            candidate_mask = self._available_masks[d_idx][s_idx] & ~self._shift_masks[d_idx][s_idx]
+            free_mask = candidate_mask & ~self._other_shift_masks[d_idx][s_idx]
             
-            # If we still have no available doctors, try ANY available doctor 
-            # (even if already assigned to another shift today)
-            if not available_doctors:
-                for doctor in [doc["name"] for doc in self.doctors]:
-                    if doctor == old_doctor:
-                        continue
-                    
-                    # Skip if already in this shift (would cause duplicate)
-                    if doctor in current_assignment:
-                        continue
-                    
-                    if not self._is_doctor_available(doctor, date, shift):
-                        continue
-                    
-                    available_doctors.append(doctor)
+            # Prefer doctors free today whose preference allows the shift, then
+            # doctors free today regardless of preference, then ANY available
+            # doctor (even if already assigned to another shift today)
+            replacement_mask = (free_mask & self._assignable_masks[s_idx]) or free_mask or candidate_mask
                     
             # If still no available doctors, just skip this attempt
-            if not available_doctors:
+            if not replacement_mask:
                 continue
+            available_doctors = self._doctors_in_mask(replacement_mask)
                 
             # Select a random replacement
             new_doctor = random.choice(available_doctors)
             
-            # Create new schedule with safe replacement
-            new_schedule = self._create_new_schedule(current_schedule, date, shift, idx, old_doctor, new_doctor)
+            return (date, shift, idx, old_doctor, new_doctor)
             
-            return (new_schedule, (date, shift, old_doctor, new_doctor))
-            
-        return None  # Failed to find a neighbor
+        return None  # Failed to find a move
 
     # -------------------------------
     # Tabu Search Main Loop
@@ -2516,23 +2641,22 @@ class MonthlyScheduleOptimizer:
         """
         start_time = time.time()
         logger.info(f"Starting Monthly Tabu Search optimization for month {self.month}")
+        self._required_slots = self._build_required_slots()
+        self._slot_limits = self._build_required_slots(default_absent_shifts=True)
+        self._coverage_slots = self._build_required_slots(default_missing_slots=False)
+        self._template_slots = self._build_template_slots()
+        self._balance_groups = self._build_balance_groups()
         if progress_callback:
             progress_callback(5, f"Initializing Monthly Tabu Search for {self.month}...")
             
         # Check doctor availability to warn about potential workload imbalance
-        total_shifts_needed = 0
-        for date in self.all_dates:
-            for shift in self.shifts:
-                total_shifts_needed += self.shift_requirements[shift]
-                
-        doctor_names = [doc["name"] for doc in self.doctors]
+        doctor_names = self.doctor_names
         availability_counts = {doctor: 0 for doctor in doctor_names}
         
-        for date in self.all_dates:
-            for shift in self.shifts:
-                for doctor in doctor_names:
-                    if self._is_doctor_available(doctor, date, shift):
-                        availability_counts[doctor] += 1
+        for masks in self._available_masks:
+            for available_mask in masks:
+                for doctor in self._doctors_in_mask(available_mask):
+                    availability_counts[doctor] += 1
         
         # Log doctors with very limited availability
         for doctor, count in availability_counts.items():
@@ -2545,12 +2669,16 @@ class MonthlyScheduleOptimizer:
         # Generate initial schedule with smarter starting point
         current_schedule = self.generate_initial_schedule()
         current_cost = self.objective(current_schedule)
-        best_schedule = copy.deepcopy(current_schedule)  # Use deep copy to avoid reference issues
+        # Schedules are never modified in place during the search (moves copy the
+        # changed path), so the best one is kept by reference and copied once
+        # after the search, before the final fixes below edit it
+        best_schedule = current_schedule
         best_cost = current_cost
 
         # For monthly optimization, we can use a smaller tabu tenure and fewer iterations
         # since the search space is smaller
         tabu_list = {}  # Map move (tuple) to expiration iteration
+        tabu_expiry = []  # Min-heap of (expiration iteration, move) for dropping expired moves
         tabu_tenure = 15  # Smaller for monthly - was 20 for yearly
         max_iterations = 1000  # Fewer iterations needed for monthly - was 1500 for yearly
         no_improve_count = 0
@@ -2568,6 +2696,13 @@ class MonthlyScheduleOptimizer:
             iteration += 1
             phase_iterations += 1
             
+            # Drop moves whose tabu tenure has expired; a move re-added since
+            # has a newer expiration and keeps its entry
+            while tabu_expiry and tabu_expiry[0][0] <= iteration:
+                expiration, expired_move = heapq.heappop(tabu_expiry)
+                if tabu_list.get(expired_move) == expiration:
+                    del tabu_list[expired_move]
+            
             # Switch optimization phase periodically
             if phase_iterations >= phase_max:
                 phase_iterations = 0
@@ -2587,74 +2722,82 @@ class MonthlyScheduleOptimizer:
                         f"Iteration {iteration}: Starting {current_phase} optimization phase"
                     )
             
-            # Get neighbors with smarter move generation
-            neighbors = self.get_neighbors(current_schedule, num_moves=20)  # Fewer moves for monthly (was 25)
+            # Get candidate moves with smarter move generation; they are scored
+            # by their cost delta and only the chosen one is turned into a schedule
+            candidates = self._candidate_moves(current_schedule, num_moves=20)  # Fewer moves for monthly (was 25)
             
             # If no valid neighbors could be generated, break
-            if not neighbors:
+            if not candidates:
                 logger.warning(f"No valid neighbors found at iteration {iteration}. Stopping early.")
                 break
                 
-            best_neighbor = None
+            best_candidate = None
             best_neighbor_cost = float('inf')
             best_move = None
 
-            for neighbor_schedule, move in neighbors:
-                move_key = move
-                neighbor_cost = self.objective(neighbor_schedule)
+            for candidate in candidates:
+                date, shift, idx, old_doctor, new_doctor = candidate
+                move_key = (date, shift, old_doctor, new_doctor)
+                new_doctors = self._moved_shift_doctors(current_schedule.get(date, {}).get(shift, ()),
+                                                        date, shift, idx, old_doctor, new_doctor)
+                
+                # Tabu moves only count if they would be the best solution found so far,
+                # so neighbors that cannot beat the relevant cost need no exact score
+                is_tabu = move_key in tabu_list and iteration < tabu_list[move_key]
+                cost_bound = min(best_neighbor_cost, best_cost) if is_tabu else best_neighbor_cost
+                neighbor_cost = current_cost + self._objective_delta(current_schedule, date, shift, new_doctors,
+                                                                     bound=cost_bound - current_cost)
                 
                 # Skip tabu moves unless they would be the best solution found so far
-                if move_key in tabu_list and iteration < tabu_list[move_key] and neighbor_cost >= best_cost:
+                if is_tabu and neighbor_cost >= best_cost:
                     continue
                     
                 if neighbor_cost < best_neighbor_cost:
-                    best_neighbor = neighbor_schedule
+                    best_candidate = candidate
                     best_neighbor_cost = neighbor_cost
-                    best_move = move
+                    best_move = move_key
 
-            if best_neighbor is None:
+            if best_candidate is None:
                 break
 
-            current_schedule = best_neighbor
+            current_schedule = self._create_new_schedule(current_schedule, *best_candidate)
             current_cost = best_neighbor_cost
+            self._apply_move(current_schedule, best_move[0], best_move[1])
 
             tabu_list[best_move] = iteration + tabu_tenure
-            
-            # Clean up the tabu list periodically
-            if iteration % 10 == 0:
-                tabu_list = {m: exp for m, exp in tabu_list.items() if exp > iteration}
+            heapq.heappush(tabu_expiry, (iteration + tabu_tenure, best_move))
 
             if current_cost < best_cost:
-                best_schedule = copy.deepcopy(current_schedule)  # Use deep copy to avoid reference issues
+                # Re-score new bests in full so rounding in the deltas never
+                # accumulates into best_cost
+                current_cost = self.objective(current_schedule)
+                best_schedule = current_schedule
                 best_cost = current_cost
                 no_improve_count = 0
                 
                 # Every 40 iterations, log key metrics for monitoring (more frequent in monthly)
                 if iteration % 40 == 0:
-                    # Calculate important metrics for the best schedule
-                    monthly_hours, doctors_to_exclude = self._calculate_monthly_hours(best_schedule)
-                    wh_hours, _ = self._calculate_weekend_holiday_hours(best_schedule)
+                    # best_schedule is the tracked schedule here, so its hour totals are
+                    # already up to date
+                    month = self.month
+                    monthly_hours = self._monthly_hours
+                    wh_hours = self._weekend_holiday_hours
+                    doctors_to_exclude = self._doctors_to_exclude
                     
                     # Calculate workload variance for the month, excluding doctors with limited availability
-                    month_values = [hrs.get(self.month, 0) for doc, hrs in monthly_hours.items() 
-                                   if hrs.get(self.month, 0) > 0 and doc not in doctors_to_exclude]
+                    month_values = [hrs.get(month, 0) for doc, hrs in monthly_hours.items() 
+                                   if hrs.get(month, 0) > 0 and doc not in doctors_to_exclude]
                     workload_variance = max(month_values) - min(month_values) if month_values else 0
                     
                     # Senior vs junior workload, excluding doctors with limited availability
-                    senior_avg = sum(monthly_hours[doc].get(self.month, 0) for doc in self.senior_doctors 
-                                   if doc not in doctors_to_exclude) / max(len([d for d in self.senior_doctors 
-                                                                             if d not in doctors_to_exclude]), 1)
-                    junior_avg = sum(monthly_hours[doc].get(self.month, 0) for doc in self.junior_doctors 
-                                   if doc not in doctors_to_exclude) / max(len([d for d in self.junior_doctors 
-                                                                             if d not in doctors_to_exclude]), 1)
+                    balanced_seniors = [doc for doc in self.senior_doctors if doc not in doctors_to_exclude]
+                    balanced_juniors = [doc for doc in self.junior_doctors if doc not in doctors_to_exclude]
+                    senior_avg = sum(monthly_hours[doc].get(month, 0) for doc in balanced_seniors) / max(len(balanced_seniors), 1)
+                    junior_avg = sum(monthly_hours[doc].get(month, 0) for doc in balanced_juniors) / max(len(balanced_juniors), 1)
                     
                     # Weekend/holiday metrics, excluding doctors with limited availability
-                    senior_wh_avg = sum(wh_hours.get(doc, 0) for doc in self.senior_doctors 
-                                     if doc not in doctors_to_exclude) / max(len([d for d in self.senior_doctors 
-                                                                              if d not in doctors_to_exclude]), 1)
-                    junior_wh_avg = sum(wh_hours.get(doc, 0) for doc in self.junior_doctors 
-                                     if doc not in doctors_to_exclude) / max(len([d for d in self.junior_doctors 
-                                                                              if d not in doctors_to_exclude]), 1)
+                    senior_wh_avg = sum(wh_hours.get(doc, 0) for doc in balanced_seniors) / max(len(balanced_seniors), 1)
+                    junior_wh_avg = sum(wh_hours.get(doc, 0) for doc in balanced_juniors) / max(len(balanced_juniors), 1)
                     
                     logger.info(f"Iteration {iteration} metrics - Cost: {best_cost:.2f}, "
                                f"Month {self.month} balance: {workload_variance}h, "
@@ -2685,109 +2828,70 @@ class MonthlyScheduleOptimizer:
                                 f"Iteration {iteration}: Best cost = {best_cost:.2f} ({current_phase} phase)")
 
         solution_time = time.time() - start_time
+        best_schedule = self._copy_schedule(best_schedule)
 
         # -------------------------------
         # Calculate final statistics
         # -------------------------------
         schedule = best_schedule
-        doctor_names = [doc["name"] for doc in self.doctors]
-        doctor_shift_counts = {doc: 0 for doc in doctor_names}
-        preference_metrics = {}
-        weekend_metrics = {}
-        holiday_metrics = {}
+        doctor_names = self.doctor_names
+        all_dates = self.all_dates
+        shifts = self.shifts
+        required_table = self._required_slots
+        doctor_indices = self.doctor_indices
+        shift_template = getattr(self, 'shift_template', None)
 
-        for doc in self.doctors:
-            name = doc["name"]
-            pref = doc.get("pref", "None")
-            preference_metrics[name] = {"preference": pref, "preferred_shifts": 0, "other_shifts": 0}
-            weekend_metrics[name] = 0
-            holiday_metrics[name] = 0
+        # Shifts per doctor by date index and by shift index
+        worked_days, shift_totals = self._count_doctor_shifts(schedule)
+        worked = np.array([worked_days[doc] for doc in doctor_names], dtype=np.int32).reshape(len(doctor_names), -1)
+        totals = np.array([shift_totals[doc] for doc in doctor_names], dtype=np.int32).reshape(len(doctor_names), -1)
+        weekend_idx = [i for i, date in enumerate(all_dates) if date in self.weekends]
+        holiday_idx = [i for i, date in enumerate(all_dates) if date in self.holidays]
 
-        for date in self.all_dates:
-            if date not in schedule:
-                continue
-                
-            for shift in self.shifts:
-                if shift not in schedule[date]:
-                    continue
-                    
-                for doctor in schedule[date][shift]:
-                    doctor_shift_counts[doctor] += 1
-                    
-                    if date in self.weekends:
-                        weekend_metrics[doctor] += 1
-                        
-                    if date in self.holidays:
-                        holiday_metrics[doctor] += 1
-                        
-                    doc_info = next((d for d in self.doctors if d["name"] == doctor), None)
-                    if doc_info and "pref" in doc_info and doc_info["pref"] != "None":
-                        if (doc_info["pref"] == "Day Only" and shift == "Day") or \
-                           (doc_info["pref"] == "Evening Only" and shift == "Evening") or \
-                           (doc_info["pref"] == "Night Only" and shift == "Night"):
-                            preference_metrics[doctor]["preferred_shifts"] += 1
-                        else:
-                            preference_metrics[doctor]["other_shifts"] += 1
+        shift_count_values = totals.sum(axis=1).tolist()
+        doctor_shift_counts = dict(zip(doctor_names, shift_count_values))
+        weekend_metrics = dict(zip(doctor_names, worked[:, weekend_idx].sum(axis=1).tolist()))
+        holiday_metrics = dict(zip(doctor_names, worked[:, holiday_idx].sum(axis=1).tolist()))
 
-        coverage_errors = 0
-        for date in self.all_dates:
-            if date not in schedule:
-                # Check if this date has template requirements
-                has_template = hasattr(self, 'shift_template') and date in self.shift_template
-                
-                if has_template:
-                    # Count missing shifts specifically required by the template
-                    for shift in self.shifts:
-                        if shift in self.shift_template[date] and self.shift_template[date][shift].get('slots', 0) > 0:
-                            coverage_errors += 1
-                else:
-                    # No template - use default shift requirements
-                    coverage_errors += len(self.shifts)
+        preference_metrics = {}
+        for doctor, doctor_totals, total in zip(doctor_names, totals.tolist(), shift_count_values):
+            pref = self.doctor_info[doctor]["pref"]
+            preferred = 0
+            if pref != "None" and self.pref_shift[doctor] is not None:
+                preferred = doctor_totals[self.shift_indices[self.pref_shift[doctor]]]
+            preference_metrics[doctor] = {
+                "preference": pref,
+                "preferred_shifts": preferred,
+                "other_shifts": total - preferred if pref != "None" else 0
+            }
+
+        # Filled and distinct doctor counts per (date, shift); a missing date or
+        # shift counts as an empty one
+        filled_counts = np.zeros(required_table.shape, dtype=np.int32)
+        distinct_counts = np.zeros(required_table.shape, dtype=np.int32)
+        for d_idx, date in enumerate(all_dates):
+            day = schedule.get(date)
+            if not day:
                 continue
-                
-            for shift in self.shifts:
-                # Determine the required number of doctors for this shift
-                has_template = hasattr(self, 'shift_template') and date in self.shift_template
-                required_slots = 0
-                
-                if has_template and shift in self.shift_template[date]:
-                    required_slots = self.shift_template[date][shift].get('slots', 0)
-                elif not has_template:
-                    required_slots = self.shift_requirements[shift]
-                
-                # Skip if no slots required for this shift
-                if required_slots <= 0:
-                    continue
-                
-                # Check if shift is missing
-                if shift not in schedule[date]:
-                    coverage_errors += 1
-                    continue
-                    
-                # Check if shift is understaffed
-                if len(schedule[date][shift]) < required_slots:
-                    coverage_errors += 1
+            for s_idx, shift in enumerate(shifts):
+                shift_doctors = day.get(shift)
+                if shift_doctors:
+                    filled_counts[d_idx, s_idx] = len(shift_doctors)
+                    distinct_counts[d_idx, s_idx] = len(set(shift_doctors))
+
+        # Shifts that are missing or understaffed; template entries without a
+        # 'slots' key and shifts the template leaves out require none here
+        coverage_errors = int((filled_counts < self._coverage_slots).sum())
 
         # Check for duplicate doctors in the final schedule
-        duplicate_count = 0
-        for date in self.all_dates:
-            if date not in schedule:
-                continue
-                
-            for shift in self.shifts:
-                if shift not in schedule[date]:
-                    continue
-                    
-                # Check for duplicates in this shift
-                shift_doctors = schedule[date][shift]
-                unique_doctors = set(shift_doctors)
-                if len(shift_doctors) > len(unique_doctors):
-                    # Count duplicates
-                    duplicate_count += len(shift_doctors) - len(unique_doctors)
-                    
-                    # Log the issue
-                    duplicates = [d for d in shift_doctors if shift_doctors.count(d) > 1]
-                    logger.warning(f"Duplicate doctor(s) in final schedule at {date}, {shift}: {duplicates}")
+        extra_counts = filled_counts - distinct_counts
+        duplicate_count = int(extra_counts.sum())
+        for d_idx, s_idx in np.argwhere(extra_counts > 0).tolist():
+            date = all_dates[d_idx]
+            shift = shifts[s_idx]
+            shift_doctors = schedule[date][shift]
+            duplicates = [d for d in shift_doctors if shift_doctors.count(d) > 1]
+            logger.warning("Duplicate doctor(s) in final schedule at %s, %s: %s", date, shift, duplicates)
 
         if progress_callback:
             progress_callback(100, "Monthly optimization complete")
@@ -2810,99 +2914,83 @@ class MonthlyScheduleOptimizer:
             }
         
         # Calculate consecutive days stats for reporting
-        consecutive_days = self._calculate_consecutive_days(schedule)
-        max_consecutive = max(consecutive_days.values())
-        avg_consecutive = sum(consecutive_days.values()) / len(consecutive_days)
+        # Each doctor's latest run of working days, as _calculate_consecutive_days
+        # reports it: run_lengths[i, d] is the run ending on date d (0 on a day off)
+        worked_mask = worked > 0
+        date_positions = np.arange(worked_mask.shape[1])
+        last_day_off = np.maximum.accumulate(np.where(worked_mask, -1, date_positions), axis=1)
+        run_lengths = date_positions - last_day_off
+        last_worked = worked_mask.shape[1] - 1 - worked_mask[:, ::-1].argmax(axis=1)
+        consecutive_values = run_lengths[np.arange(len(doctor_names)), last_worked].tolist()
+        max_consecutive = max(consecutive_values)
+        avg_consecutive = sum(consecutive_values) / len(consecutive_values)
         
         # Check for availability violations in final schedule
         availability_violations = 0
-        for date in self.all_dates:
+        for d_idx, date in enumerate(all_dates):
             if date not in best_schedule:
                 continue
                 
-            for shift in self.shifts:
+            for s_idx, shift in enumerate(shifts):
                 if shift not in best_schedule[date]:
                     continue
                     
+                available_mask = self._available_masks[d_idx][s_idx]
                 for doctor in best_schedule[date][shift]:
-                    if not self._is_doctor_available(doctor, date, shift):
+                    if not available_mask >> doctor_indices[doctor] & 1:
                         availability_violations += 1
         
         # NEW: Add a final validation step to fix any shifts with too many doctors
         overstaffed_shifts = []
-        for date in self.all_dates:
-            if date not in best_schedule:
-                continue
-                
-            for shift in self.shifts:
-                if shift not in best_schedule[date]:
-                    continue
-                    
-                # Determine the required number of doctors for this shift
-                required_slots = self.shift_requirements[shift]  # Default
-                if hasattr(self, 'shift_template') and date in self.shift_template and shift in self.shift_template[date]:
-                    required_slots = self.shift_template[date][shift].get('slots', self.shift_requirements[shift])
-                
-                # Count how many doctors are assigned
-                actual_slots = len(best_schedule[date][shift])
-                
-                # Fix overstaffed shifts
-                if actual_slots > required_slots:
-                    overstaffed_shifts.append((date, shift, actual_slots, required_slots))
-                    logger.warning(f"Fixing overstaffed shift: {date}, {shift}. Has {actual_slots}, needs {required_slots}")
-                    
-                    # Sort doctors by some criteria (e.g., consecutive days worked, total assignments)
-                    # to decide which ones to keep
-                    shift_doctors = best_schedule[date][shift].copy()
-                    
-                    # Calculate monthly assignments for each doctor
-                    doctor_assignments = {doctor: 0 for doctor in shift_doctors}
-                    for d in self.all_dates:
-                        if d not in best_schedule:
-                            continue
-                        for s in self.shifts:
-                            if s not in best_schedule[d]:
-                                continue
-                            for doctor in best_schedule[d][s]:
-                                if doctor in doctor_assignments:
-                                    doctor_assignments[doctor] += 1
-                    
-                    # Sort by total assignments (keep doctors with fewer assignments)
-                    shift_doctors.sort(key=lambda d: doctor_assignments.get(d, 0))
-                    
-                    # Keep only the required number of doctors
-                    best_schedule[date][shift] = shift_doctors[:required_slots]
+        # Monthly assignments per doctor, kept current as overstaffed shifts are trimmed
+        assignment_counts = dict(doctor_shift_counts)
+        # Overstaffed cells straight from the per-cell counts, in date then shift order;
+        # a shift the template leaves out is capped at its default requirement
+        slot_limits = self._slot_limits
+        for d_idx, s_idx in np.argwhere(filled_counts > slot_limits).tolist():
+            date = all_dates[d_idx]
+            shift = shifts[s_idx]
+            required_slots = int(slot_limits[d_idx, s_idx])
+            actual_slots = int(filled_counts[d_idx, s_idx])
+            
+            # Fix overstaffed shifts
+            overstaffed_shifts.append((date, shift, actual_slots, required_slots))
+            logger.warning("Fixing overstaffed shift: %s, %s. Has %d, needs %d", date, shift, actual_slots, required_slots)
+            
+            # Sort doctors by some criteria (e.g., consecutive days worked, total assignments)
+            # to decide which ones to keep. best_schedule was copied after the search,
+            # so its shift lists can be trimmed in place
+            shift_doctors = best_schedule[date][shift]
+            
+            # Sort by total assignments (keep doctors with fewer assignments)
+            shift_doctors.sort(key=lambda d: assignment_counts.get(d, 0))
+            
+            # Keep only the required number of doctors
+            for doctor in shift_doctors[required_slots:]:
+                assignment_counts[doctor] -= 1
+            del shift_doctors[required_slots:]
+            filled_counts[d_idx, s_idx] = required_slots
         
         # NEW: Add a final verification for unfilled slots in the template
         unfilled_template_slots = []
-        if hasattr(self, 'shift_template') and self.shift_template:
-            for date in self.all_dates:
-                if date not in self.shift_template:
-                    continue
-                    
-                for shift in self.shifts:
-                    if shift not in self.shift_template[date]:
-                        continue
-                    
-                    # Get required slots from template
-                    required = self.shift_template[date][shift].get('slots', 0)
-                    if required <= 0:
-                        continue
-                    
-                    # Count actual slots filled
-                    filled = 0
-                    if date in schedule and shift in schedule[date]:
-                        filled = len(schedule[date][shift])
-                    
-                    # Check if all required slots are filled
-                    if filled < required:
-                        unfilled_template_slots.append((date, shift, required, filled))
+        if shift_template:
+            # Required slots from the template; 0 where it lists no slots
+            template_required = np.zeros(required_table.shape, dtype=np.int32)
+            for d_idx, template_day in enumerate(self._template_slots):
+                for s_idx, _, required in template_day:
+                    template_required[d_idx, s_idx] = required
+            
+            # filled_counts already reflects the trimmed shifts
+            for d_idx, s_idx in np.argwhere(filled_counts < template_required).tolist():
+                unfilled_template_slots.append((all_dates[d_idx], shifts[s_idx],
+                                                int(template_required[d_idx, s_idx]),
+                                                int(filled_counts[d_idx, s_idx])))
         
         # Log unfilled slots as a critical issue
         if unfilled_template_slots:
-            logger.critical(f"CRITICAL: Final schedule has {len(unfilled_template_slots)} unfilled template slots!")
+            logger.critical("CRITICAL: Final schedule has %d unfilled template slots!", len(unfilled_template_slots))
             for date, shift, required, filled in unfilled_template_slots:
-                logger.critical(f"  - {date}, {shift}: {filled}/{required} slots filled")
+                logger.critical("  - %s, %s: %d/%d slots filled", date, shift, filled, required)
         
         stats = {
             "status": "Monthly Tabu Search completed",
@@ -2924,7 +3012,7 @@ class MonthlyScheduleOptimizer:
             },
             "iterations": iteration,
             "month": self.month,
-            "limited_availability_doctors": self._get_limited_availability_doctors()  # Add limited availability doctors
+            "limited_availability_doctors": dict(self._get_limited_availability_doctors())  # Add limited availability doctors
         }
 
         return schedule, stats
@@ -2938,18 +3026,88 @@ class MonthlyScheduleOptimizer:
         
         # ... existing code ...
 
+def _run_monthly_restart(args: Tuple[Dict[str, Any], int]) -> Dict[str, Any]:
+    """Run a single seeded restart; used as the worker in the process pool."""
+    data, seed = args
+    random.seed(seed)
+    return optimize_monthly_schedule(dict(data, parallel_restarts=1))
+
+def _optimize_with_restarts(data: Dict[str, Any], restarts: int, progress_callback: Callable = None) -> Dict[str, Any]:
+    """
+    Run independent Tabu Search restarts in worker processes and keep the best.
+
+    Each restart gets its own seed, since forked workers would otherwise
+    inherit the same random state and repeat one another. The bundled
+    Electron app avoids process pools, and running the restarts one after
+    another there would only multiply the run time, so it falls back to a
+    single search.
+    """
+    # Imported here because weight_optimizer imports this module
+    from weight_optimizer import is_electron_bundled
+
+    if is_electron_bundled():
+        logger.warning("Ignoring parallel_restarts (%d) in bundled app; running a single search", restarts)
+        return optimize_monthly_schedule(dict(data, parallel_restarts=1), progress_callback)
+
+    seeds = [random.randrange(2**32) for _ in range(restarts)]
+    if progress_callback:
+        progress_callback(5, f"Running {restarts} Tabu Search restarts in parallel")
+
+    # Results are kept in seed order so ties go to the same restart however
+    # the workers finish
+    results = [None] * restarts
+    with concurrent.futures.ProcessPoolExecutor(max_workers=restarts) as executor:
+        futures = {executor.submit(_run_monthly_restart, (data, seed)): i for i, seed in enumerate(seeds)}
+        for finished, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            results[futures[future]] = future.result()
+            if progress_callback:
+                progress_callback(5 + int(90 * finished / restarts),
+                                  f"Tabu Search restart {finished} of {restarts} finished")
+
+    successful = [result for result in results if "error" not in result]
+    if not successful:
+        errors = [result["error"] for result in results]
+        error_message = f"All {restarts} restarts failed: " + "; ".join(
+            f"restart {i + 1}: {error}" for i, error in enumerate(errors))
+        return {
+            "error": error_message,
+            "schedule": {},
+            "statistics": {
+                "status": "ERROR",
+                "error_message": error_message,
+                "restart_errors": errors
+            }
+        }
+
+    best = min(successful, key=lambda result: result["statistics"]["objective_value"])
+    best["statistics"]["parallel_restarts"] = restarts
+    if progress_callback:
+        progress_callback(100, f"Best of {restarts} restarts: objective {best['statistics']['objective_value']:.2f}")
+    return best
+
 def optimize_monthly_schedule(data: Dict[str, Any], progress_callback: Callable = None) -> Dict[str, Any]:
     """
     Main function to optimize a schedule for a single month using Tabu Search.
     
     Args:
         data: Dictionary containing doctors, holidays, availability, and month.
+              An optional "parallel_restarts" > 1 runs that many independent
+              seeded searches in worker processes and returns the best one.
+              It is capped at the CPU count and at MAX_PARALLEL_RESTARTS, and
+              ignored in the bundled app.
         progress_callback: Optional function to report progress.
         
     Returns:
         Dictionary with the optimized schedule and statistics.
     """
     try:
+        requested_restarts = int(data.get("parallel_restarts", 1) or 1)
+        parallel_restarts = max(1, min(requested_restarts, os.cpu_count() or 1, MAX_PARALLEL_RESTARTS))
+        if parallel_restarts < requested_restarts:
+            logger.warning("parallel_restarts (%d) reduced to %d", requested_restarts, parallel_restarts)
+        if parallel_restarts > 1:
+            return _optimize_with_restarts(data, parallel_restarts, progress_callback)
+
         doctors = data.get("doctors", [])
         holidays = data.get("holidays", {})
         availability = data.get("availability", {})
@@ -2978,10 +3136,15 @@ def optimize_monthly_schedule(data: Dict[str, Any], progress_callback: Callable
         if 'shift_template' in data and isinstance(data['shift_template'], dict) and len(data['shift_template']) > 0:
             # Filter the template to only include dates in the target month and year
             filtered_template = {}
+            # ISO dates of the target month all start with this prefix, so other
+            # months are rejected without parsing them
+            month_prefix = f"{year:04d}-{month:02d}-"
             for date, shifts in data['shift_template'].items():
                 # Skip metadata or non-date entries
                 if date == '_metadata' or not isinstance(date, str):
                     continue
+                if not date.startswith(month_prefix):
+                    continue
                     
                 try:
                     date_obj = datetime.date.fromisoformat(date)
@@ -3071,7 +3234,7 @@ if __name__ == "__main__":
     # Print some schedule dates as an example
     schedule = result["schedule"]
     print("\nSample schedule (first 3 days):")
-    dates = sorted(schedule.keys())[:3]
+    dates = heapq.nsmallest(3, schedule)
     for date in dates:
         print(f"\n{date}:")
         for shift in ["Day", "Evening", "Night"]: